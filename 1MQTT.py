@@ -1,7 +1,9 @@
-import json
+from sensor_payload import PayloadSchema
 
 x = '{"firstName": "Lukas", "lastName": "Pivoras", "age": "25", "city": "Moletai"}'
 
-y = json.loads(x)
+PERSON_SCHEMA = PayloadSchema({"firstName": str, "lastName": str, "age": str, "city": str})
+
+y = PERSON_SCHEMA.decode(x)
 
 print(y);
\ No newline at end of file
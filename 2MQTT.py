@@ -1,18 +1,51 @@
 import json
+import os
+from json_stream import KeyIndex, iter_users, write_users_document
 
-# Read users1.json
-with open('users1.json', 'r') as file1:
-    users1 = json.load(file1)
+# Inputs larger than this are merged as streams instead of being loaded whole
+STREAMING_THRESHOLD = 64 * 1024 * 1024
+# Keys of users2 kept in memory during a streaming merge before spilling to disk
+MAX_MEMORY_KEYS = 1000000
 
-# Read users2.json
-with open('users2.json', 'r') as file2:
-    users2 = json.load(file2)
+def merge_in_memory(path1, path2, out_path):
+    # Read users1.json
+    with open(path1, 'r') as file1:
+        users1 = json.load(file1)
 
-# Merge data from user2 into user1 
-users1["table"]["users"].update(users2["table"]["users"])
+    # Read users2.json
+    with open(path2, 'r') as file2:
+        users2 = json.load(file2)
 
-# Save the merged data to a new JSON file
-with open('merged_users.json', 'w') as outfile:
-    json.dump(users1, outfile, indent=4)
+    # Merge data from user2 into user1 
+    users1["table"]["users"].update(users2["table"]["users"])
 
-print("Users merged successfully into merged_users.json") 
\ No newline at end of file
+    # Save the merged data to a new JSON file
+    with open(out_path, 'w') as outfile:
+        json.dump(users1, outfile, indent=4)
+
+def merge_streaming(path1, path2, out_path):
+    # Index the user IDs of users2 so overridden users1 entries can be skipped
+    overrides = KeyIndex(MAX_MEMORY_KEYS)
+    try:
+        for user_id, _ in iter_users(path2):
+            overrides.add(user_id)
+
+        # users1 entries without an override keep their place, users2 entries follow
+        def merge_users(users1_items):
+            for user_id, user in users1_items:
+                if user_id not in overrides:
+                    yield user_id, user
+            yield from iter_users(path2)
+
+        with open(out_path, 'w') as outfile:
+            write_users_document(path1, outfile, merge_users)
+    finally:
+        overrides.close()
+
+if __name__ == "__main__":
+    if max(os.path.getsize('users1.json'), os.path.getsize('users2.json')) > STREAMING_THRESHOLD:
+        merge_streaming('users1.json', 'users2.json', 'merged_users.json')
+    else:
+        merge_in_memory('users1.json', 'users2.json', 'merged_users.json')
+
+    print("Users merged successfully into merged_users.json") 
@@ -1,23 +1,124 @@
 from http import client
-import paho.mqtt.client as mqtt
+import argparse
+import json
+import random
 import time
+import mqtt_common
+from mqtt_common import create_client
+from outbound_buffer import OutboundBuffer
 
-def connect_broker(broker_address, client_name):
-    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2,client_name)
-    client.connect(broker_address)
+def connect_broker(broker_address, client_name, **tuning):
+    # In-flight and queue limits can only be changed before the connection is made
+    client = create_client(client_name, **tuning)
+    client.connect(*mqtt_common.broker_address(broker_address))
     time.sleep(1)
     client.loop_start()
     
     return client
 
-if __name__ == "__main__":
-    server = "broker.hivemq.com"
-    client_name = "3LAB"
-    client = connect_broker(server, client_name)
-    try:
+def make_payloads(source, size):
+    """Yield payloads forever: lines of a file, or synthetic sensor readings padded to size bytes."""
+    if source:
+        with open(source) as f:
+            lines = [line.rstrip("\n") for line in f if line.strip()]
         while True:
-            messsage = input("Enter message: ")
-            client.publish("testtopic/temperature", messsage)
+            yield from lines
+    n = 0
+    while True:
+        n += 1
+        payload = json.dumps({
+            "Sensor_ID": f"Load-{n % 100}",
+            "Date": time.strftime("%d-%b-%Y %H:%M:%S"),
+            "Temperature": f"{random.uniform(15, 30):.2f}",
+        })
+        if len(payload) < size:
+            payload = payload[:-1] + ', "pad": "' + "x" * max(0, size - len(payload) - 11) + '"}'
+        yield payload
+
+def wait_until(deadline):
+    """Sleep until deadline (perf_counter time), spinning for the last millisecond for precision."""
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        if remaining > 0.002:
+            time.sleep(remaining - 0.001)
+
+def run_load(client, args):
+    """Publish at the target rate until count or duration is reached, reporting once per second."""
+    metrics = client.metrics
+    payloads = make_payloads(args.source, args.size)
+    interval = 1.0 / args.rate if args.rate > 0 else 0.0
+    start = time.perf_counter()
+    next_report = start + 1
+    metrics.snapshot()
+    sent = 0
+
+    try:
+        while (not args.count or sent < args.count) and (not args.duration or time.perf_counter() - start < args.duration):
+            if interval:
+                # Absolute schedule: a late send does not push back every later one
+                wait_until(start + sent * interval)
+            topic = args.topic.format(n=sent % args.topics)
+            client.publish(topic, next(payloads), qos=args.qos)
+            sent += 1
+
+            now = time.perf_counter()
+            if now >= next_report:
+                window = metrics.snapshot()
+                print(f"rate {window['publish_rate']:9.1f} msg/s  "
+                      f"ack p50 {window['ack_p50_ms']:7.2f} ms  p99 {window['ack_p99_ms']:7.2f} ms  "
+                      f"in-flight {window['inflight']}  queued {window['queued']}")
+                next_report = now + 1
     except KeyboardInterrupt:
-        client.disconnect()
-        client.loop_stop()
\ No newline at end of file
+        pass
+
+    # Give outstanding acknowledgements a moment before summarising
+    drain_deadline = time.perf_counter() + 5
+    while metrics.acked < metrics.published and time.perf_counter() < drain_deadline:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    print(f"Sent {sent} messages in {elapsed:.2f}s ({sent / elapsed:.1f} msg/s, target "
+          f"{'max' if not interval else args.rate}), {metrics.acked} acknowledged, "
+          f"max in-flight {metrics.max_inflight} (window {client.max_inflight_messages}), "
+          f"max queued {metrics.max_queued}, {metrics.published - metrics.acked} unacknowledged")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish typed messages, or generate MQTT load with --rate")
+    parser.add_argument("--broker", default="broker.hivemq.com")
+    parser.add_argument("--rate", type=float, help="Messages per second (0 = as fast as possible); enables load mode")
+    parser.add_argument("--count", type=int, default=0, help="Stop after this many messages (0 = no limit)")
+    parser.add_argument("--duration", type=float, default=0, help="Stop after this many seconds (0 = no limit)")
+    parser.add_argument("--qos", type=int, choices=[0, 1, 2], default=0)
+    parser.add_argument("--size", type=int, default=0, help="Pad synthetic payloads to this many bytes")
+    parser.add_argument("--source", help="File whose lines are published in a loop instead of synthetic payloads")
+    parser.add_argument("--topic", default="testtopic/temperature", help="Topic pattern, {n} is replaced by 0..topics-1")
+    parser.add_argument("--topics", type=int, default=1, help="Number of distinct {n} values in the topic pattern")
+    parser.add_argument("--max-inflight", type=int, default=1000, help="QoS 1/2 messages allowed in flight")
+    args = parser.parse_args()
+
+    server = args.broker
+    client_name = "3LAB"
+    if args.rate is not None:
+        # Load mode lets paho queue without limit so the generator, not the client, sets the pace
+        client = connect_broker(server, client_name, max_inflight=args.max_inflight, max_queued=0)
+        try:
+            run_load(client, args)
+        finally:
+            client.disconnect()
+            client.loop_stop()
+    else:
+        client = connect_broker(server, client_name)
+        # Messages typed while the broker is unreachable are kept on disk and replayed on reconnect
+        outbound = OutboundBuffer("3MQTT_outbound.db")
+        outbound.start(client)
+        try:
+            while True:
+                messsage = input("Enter message: ")
+                if outbound.publish(client, "testtopic/temperature", messsage) is None:
+                    print("Broker unreachable, message buffered for replay")
+        except KeyboardInterrupt:
+            print(f"Outbound buffer: {outbound.get_stats()}")
+            client.disconnect()
+            client.loop_stop()
+            outbound.close()
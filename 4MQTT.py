@@ -1,40 +1,81 @@
-import sqlite3
-import paho.mqtt.client as mqtt
 import json
+import sqlite3
+import time
+import uuid
+from mqtt_common import broker_address, create_client, log_metrics_periodically
+from ingest_dedup import DuplicateFilter
+from sensor_analytics import AnomalyDetector
+from sensor_payload import PayloadError, decode_sensor_payload, is_binary_payload, parse_timestamp
 
 MQTT_Topic = "Home/BedRoom/#"
 mqttBroker = "broker.hivemq.com"
+# The persistent session belongs to this ID, so it must be unique on a shared broker yet
+# the same across restarts; the suffix is this machine's hardware address
+MQTT_Client_ID = f"Sniffer-{uuid.getnode():012x}"
+METRICS_INTERVAL = 60  # Seconds between MQTT metrics reports
+
+# Streaming alerts, published as JSON to ALERT_TOPIC/<field>. Kinds: above / below a
+# fixed limit, zscore (standard deviations from the sensor's moving mean), jump (change
+# since the previous reading) and spread (rolling max - min). See sensor_analytics.py.
+ALERT_TOPIC = "Home/Alerts"
+ALERT_RULES = [
+    {"field": "Temperature", "kind": "above", "limit": 35},
+    {"field": "Temperature", "kind": "below", "limit": 5},
+    {"field": "Temperature", "kind": "zscore", "limit": 4},
+    {"field": "Humidity", "kind": "above", "limit": 85},
+    {"field": "Humidity", "kind": "jump", "limit": 15},
+    {"field": "Pressure", "kind": "spread", "limit": 20},
+]
+detector = AnomalyDetector(ALERT_RULES)
+
+# QoS 1 redeliveries are dropped by (field, sensor, date): in memory while recent,
+# by the unique index on the table otherwise. Only newly stored readings raise alerts.
+duplicates = DuplicateFilter()
 
 # SQLite DB Name
 DB_Name = "IoT.db"
 
 # SQLite DB Table Schema
+# Existing tables and their readings are kept across restarts; build_db migrates older ones
+SENSOR_TABLES = ("Temperature_Data", "Humidity_Data", "Pressure_Data")
 TableSchema = """
-drop table if exists Temperature_Data;
-create table Temperature_Data (
+create table if not exists Temperature_Data (
   id integer primary key autoincrement,
   SensorID text,
   Date_n_Time text,
-  Temperature text
+  Temperature text,
+  Timestamp real
 );
 
-drop table if exists Humidity_Data;
-create table Humidity_Data (
+create table if not exists Humidity_Data (
   id integer primary key autoincrement,
   SensorID text,
   Date_n_Time text,
-  Humidity text
+  Humidity text,
+  Timestamp real
 );
 
-drop table if exists Pressure_Data;
-create table Pressure_Data (
+create table if not exists Pressure_Data (
   id integer primary key autoincrement,
   SensorID text,
   Date_n_Time text,
-  Pressure text
+  Pressure text,
+  Timestamp real
 );
 """
 
+# Created after migrate_tables(), once every table has a Timestamp column and no duplicates
+IndexSchema = """
+create index if not exists Temperature_Data_Timestamp on Temperature_Data (Timestamp);
+create unique index if not exists Temperature_Data_Reading on Temperature_Data (SensorID, Date_n_Time);
+
+create index if not exists Humidity_Data_Timestamp on Humidity_Data (Timestamp);
+create unique index if not exists Humidity_Data_Reading on Humidity_Data (SensorID, Date_n_Time);
+
+create index if not exists Pressure_Data_Timestamp on Pressure_Data (Timestamp);
+create unique index if not exists Pressure_Data_Reading on Pressure_Data (SensorID, Date_n_Time);
+"""
+
 class DatabaseManager:
     def __init__(self):
         self.conn = sqlite3.connect(DB_Name)
@@ -45,82 +86,145 @@ class DatabaseManager:
     def add_del_update_db_record(self, sql_query, args=()):
         self.cur.execute(sql_query, args)
         self.conn.commit()
+        return self.cur.rowcount
 
     def __del__(self):
         self.cur.close()
         self.conn.close()
 
+def migrate_tables(conn):
+    # Tables created before the Timestamp column and the unique reading index existed
+    conn.create_function("parse_timestamp", 1, parse_timestamp, deterministic=True)
+    for table in SENSOR_TABLES:
+        columns = [row[1] for row in conn.execute(f"pragma table_info({table})")]
+        if "Timestamp" not in columns:
+            conn.execute(f"alter table {table} add column Timestamp real")
+            # Readings in another date format keep a null Timestamp and stay out of time ranges
+            backfilled = conn.execute(f"update {table} set Timestamp = parse_timestamp(Date_n_Time)").rowcount
+            print(f"Added Timestamp to {table}, backfilled {backfilled} rows")
+        indexes = [row[1] for row in conn.execute(f"pragma index_list({table})")]
+        if f"{table}_Reading" not in indexes:
+            removed = conn.execute(f"delete from {table} where id not in "
+                                   f"(select min(id) from {table} group by SensorID, Date_n_Time)").rowcount
+            if removed:
+                print(f"Removed {removed} duplicate readings from {table}")
+    conn.commit()
+
 def build_db(TableSchema):
     # Connect or Create DB File
     conn = sqlite3.connect(DB_Name)
     curs = conn.cursor()
 
-    # Create Tables
+    # Create Tables, migrate the ones an older version created, then index them
     sqlite3.complete_statement(TableSchema)
     curs.executescript(TableSchema)
+    migrate_tables(conn)
+    curs.executescript(IndexSchema)
 
     # Close DB
     curs.close()
     conn.close()
 
+# Epoch seconds stored next to Date_n_Time so time ranges can use an index
+def reading_timestamp(Data_and_Time):
+    timestamp = parse_timestamp(Data_and_Time)
+    return timestamp if timestamp is not None else time.time()
+
 # Function to save Temperature to DB Table
-def Temp_Data_Handler(jsonData):
-    json_Dict = json.loads(jsonData)
+def Temp_Data_Handler(json_Dict):
     SensorID = json_Dict['Sensor_ID']
     Data_and_Time = json_Dict['Date']
     Temperature = json_Dict['Temperature']
     
     dbObj = DatabaseManager()
-    dbObj.add_del_update_db_record("insert into Temperature_Data (SensorID, Date_n_Time, Temperature) values (?,?,?)",
-                                   [SensorID, Data_and_Time, Temperature])
+    inserted = dbObj.add_del_update_db_record("insert or ignore into Temperature_Data (SensorID, Date_n_Time, Temperature, Timestamp) values (?,?,?,?)",
+                                              [SensorID, Data_and_Time, Temperature, reading_timestamp(Data_and_Time)])
     del dbObj
-    print("Inserted Temperature Data into Database.")
+    if inserted:
+        print("Inserted Temperature Data into Database.")
+    else:
+        duplicates.record_db_duplicate()
+        print("Ignored duplicate Temperature reading already in the Database.")
+    return inserted
 
 # Function to save Humidity to DB Table
-def Humidity_Data_Handler(jsonData):
-    json_Dict = json.loads(jsonData)
+def Humidity_Data_Handler(json_Dict):
     SensorID = json_Dict['Sensor_ID']
     Data_and_Time = json_Dict['Date']
     Humidity = json_Dict['Humidity']
     
     dbObj = DatabaseManager()
-    dbObj.add_del_update_db_record("insert into Humidity_Data (SensorID, Date_n_Time, Humidity) values (?,?,?)",
-                                   [SensorID, Data_and_Time, Humidity])
+    inserted = dbObj.add_del_update_db_record("insert or ignore into Humidity_Data (SensorID, Date_n_Time, Humidity, Timestamp) values (?,?,?,?)",
+                                              [SensorID, Data_and_Time, Humidity, reading_timestamp(Data_and_Time)])
     del dbObj
-    print("Inserted Humidity Data into Database.")
+    if inserted:
+        print("Inserted Humidity Data into Database.")
+    else:
+        duplicates.record_db_duplicate()
+        print("Ignored duplicate Humidity reading already in the Database.")
+    return inserted
 
 # Function to save Pressure to DB Table
-def Pressure_Data_Handler(jsonData):
-    json_Dict = json.loads(jsonData)
+def Pressure_Data_Handler(json_Dict):
     SensorID = json_Dict['Sensor_ID']
     Data_and_Time = json_Dict['Date']
     Pressure = json_Dict['Pressure']
     
     dbObj = DatabaseManager()
-    dbObj.add_del_update_db_record("insert into Pressure_Data (SensorID, Date_n_Time, Pressure) values (?,?,?)",
-                                   [SensorID, Data_and_Time, Pressure])
+    inserted = dbObj.add_del_update_db_record("insert or ignore into Pressure_Data (SensorID, Date_n_Time, Pressure, Timestamp) values (?,?,?,?)",
+                                              [SensorID, Data_and_Time, Pressure, reading_timestamp(Data_and_Time)])
     del dbObj
-    print("Inserted Pressure Data into Database.")
+    if inserted:
+        print("Inserted Pressure Data into Database.")
+    else:
+        duplicates.record_db_duplicate()
+        print("Ignored duplicate Pressure reading already in the Database.")
+    return inserted
 
 # Function to handle different sensor data types
-def sensor_Data_Handler(Topic, jsonData):
-    if "Temperature" in Topic:
-        Temp_Data_Handler(jsonData)
-    elif "Humidity" in Topic:
-        Humidity_Data_Handler(jsonData)
-    elif "Pressure" in Topic:
-        Pressure_Data_Handler(jsonData)
+def sensor_Data_Handler(Topic, payload, client=None):
+    # JSON readings are typed by their topic, binary ones carry their own sensor kind
+    for field, json_Dict in decode_sensor_payload(Topic, payload):
+        key = (field, json_Dict['Sensor_ID'], json_Dict['Date'])
+        if duplicates.seen(*key):
+            print(f"Dropped duplicate {field} reading from {json_Dict['Sensor_ID']} "
+                  f"(dedup rate {duplicates.rate():.2%})")
+            continue
+        if field == "Temperature":
+            inserted = Temp_Data_Handler(json_Dict)
+        elif field == "Humidity":
+            inserted = Humidity_Data_Handler(json_Dict)
+        elif field == "Pressure":
+            inserted = Pressure_Data_Handler(json_Dict)
+        else:
+            continue
+        # A redelivery the filter had forgotten is rejected by the insert and raises no alerts
+        if not inserted:
+            continue
+        duplicates.add(*key)
+        for alert in detector.process(json_Dict['Sensor_ID'], field, json_Dict[field], json_Dict['Date']):
+            print("Alert:", alert['Rule'], "from", alert['Sensor_ID'], "observed", alert['Observed'])
+            if client is not None:
+                client.publish(f"{ALERT_TOPIC}/{field}", json.dumps(alert), qos=1)
 
 # MQTT Callback Function for Receiving Messages
 def on_message(client, userdata, message):
-    print("Received message:", str(message.payload.decode("utf-8")))
-    sensor_Data_Handler(message.topic, message.payload)
+    if is_binary_payload(message.payload):
+        print(f"Received binary message: {len(message.payload)} bytes")
+    else:
+        print("Received message:", message.payload.decode("utf-8", errors="replace"))
+    try:
+        sensor_Data_Handler(message.topic, message.payload, client)
+    except PayloadError as e:
+        print("Rejected payload:", e)
 
 if __name__ == "__main__":
     build_db(TableSchema)
-    client = mqtt.Client("Sniffer")
-    client.connect(mqttBroker)
+    # A persistent session makes the broker keep QoS 1 readings for us while we are offline
+    client = create_client(MQTT_Client_ID, clean_session=False)
+    client.connect(*broker_address(mqttBroker))
 
-    client.subscribe(MQTT_Topic)
+    client.subscribe(MQTT_Topic, qos=1)
+    log_metrics_periodically(client, METRICS_INTERVAL)
     client.on_message = on_message
     client.loop_forever()
\ No newline at end of file
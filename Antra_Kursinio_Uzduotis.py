@@ -5,10 +5,11 @@ import os
 import webbrowser
 from threading import Timer, Thread
 from datetime import datetime
-import paho.mqtt.client as mqtt
+from mqtt_common import broker_address, create_client
 import time
 import uuid
 import queue
+from outbound_buffer import OutboundBuffer
 
 # Global variables for MQTT
 mqtt_messages = queue.Queue(maxsize=100)  # Store last 100 messages
@@ -20,6 +21,9 @@ mqtt_topic_publish = "exchange/rates/data"
 mqtt_topic_subscribe = "exchange/rates/messages"
 # Add a debug flag to print more information
 mqtt_debug = True
+# Messages published while disconnected are kept on disk and replayed after reconnect.
+# The rates topic only ever needs its newest snapshot, so buffered updates coalesce.
+outbound_buffer = OutboundBuffer("exchange_rates_outbound.db", coalesce_topics={mqtt_topic_publish})
 
 # MQTT callback functions
 def on_connect(client, userdata, flags, rc, properties=None):
@@ -28,17 +32,8 @@ def on_connect(client, userdata, flags, rc, properties=None):
     Handles both MQTT v3.1.1 and v5 protocols.
     """
     global mqtt_connected, mqtt_debug
-    rc_codes = {
-        0: "Connection successful",
-        1: "Connection refused - incorrect protocol version",
-        2: "Connection refused - invalid client identifier",
-        3: "Connection refused - server unavailable",
-        4: "Connection refused - bad username or password",
-        5: "Connection refused - not authorized"
-    }
-
     if rc == 0:
-        print(f"Connected to MQTT broker: {rc_codes.get(rc, 'Unknown result code')}")
+        print(f"Connected to MQTT broker: {rc}")
         mqtt_connected = True
         # Subscribe to both topics to ensure we can receive messages
         client.subscribe(mqtt_topic_publish, qos=1)
@@ -63,15 +58,15 @@ def on_connect(client, userdata, flags, rc, properties=None):
         if mqtt_debug:
             print(f"Published test messages to both topics")
     else:
-        print(f"Failed to connect to MQTT broker: {rc_codes.get(rc, 'Unknown error')}")
+        print(f"Failed to connect to MQTT broker: {rc}")
         mqtt_connected = False
 
-def on_disconnect(client, userdata, rc):
+def on_disconnect(client, userdata, flags, rc, properties=None):
     global mqtt_connected, mqtt_debug
 
     if mqtt_debug:
         print(f"Disconnected from MQTT broker with code {rc}")
-        if rc > 0:
+        if rc.is_failure:
             print("Unexpected disconnection")
 
     mqtt_connected = False
@@ -102,7 +97,7 @@ def on_message(client, userdata, msg):
             import traceback
             traceback.print_exc()
 
-def on_publish(client, userdata, mid):
+def on_publish(client, userdata, mid, reason_code=None, properties=None):
     global mqtt_debug
 
     if mqtt_debug:
@@ -119,8 +114,8 @@ def setup_mqtt():
         if mqtt_debug:
             print(f"Creating MQTT client with ID: {mqtt_client_id}")
 
-        # Use MQTT v3.1.1 for better compatibility
-        mqtt_client = mqtt.Client(client_id=mqtt_client_id, protocol=mqtt.MQTTv311)
+        # Use MQTT v3.1.1 for better compatibility (the shared client's default)
+        mqtt_client = create_client(mqtt_client_id)
         if mqtt_debug:
             print("Using MQTT v3.1.1 protocol")
 
@@ -134,34 +129,27 @@ def setup_mqtt():
         if mqtt_debug:
             print("Connecting to broker.hivemq.com...")
 
-        # Use synchronous connection for better error reporting
-        try:
-            mqtt_client.connect("broker.hivemq.com", 1883, keepalive=30)
-            if mqtt_debug:
-                print("Connection initiated")
-        except Exception as e:
-            if mqtt_debug:
-                print(f"Initial connection attempt failed: {e}")
-            # Try alternative broker immediately
-            try:
-                if mqtt_debug:
-                    print("Trying alternative broker test.mosquitto.org...")
-                mqtt_client.connect("test.mosquitto.org", 1883, keepalive=30)
-                if mqtt_debug:
-                    print("Connection to alternative broker initiated")
-            except Exception as e2:
-                if mqtt_debug:
-                    print(f"Alternative connection attempt failed: {e2}")
-                return False
-
-        # Start MQTT loop in a separate thread
+        # Connect in the network thread, so a broker that is down at startup is retried
+        # by loop_start() instead of leaving the client without a loop
+        mqtt_client.connect_async(*broker_address("broker.hivemq.com", 1883), keepalive=30)
         mqtt_client.loop_start()
+        # Replays buffered messages whenever the client is connected, whichever broker it reaches
+        outbound_buffer.start(mqtt_client)
+        if mqtt_debug:
+            print("Connection initiated")
 
         # Wait for connection or timeout
         connection_timeout = 10  # seconds - increased timeout
         start_time = time.time()
+        alternative_tried = False
         while not mqtt_connected and time.time() - start_time < connection_timeout:
             time.sleep(0.5)  # Longer sleep to reduce CPU usage
+            if not alternative_tried and time.time() - start_time >= connection_timeout / 2:
+                # The loop's next reconnect attempt goes to the alternative broker
+                alternative_tried = True
+                if mqtt_debug:
+                    print("Trying alternative broker test.mosquitto.org...")
+                mqtt_client.connect_async(*broker_address("test.mosquitto.org", 1883), keepalive=30)
             if mqtt_debug and (time.time() - start_time) % 2 < 0.5:
                 print(f"Waiting for connection... ({int(time.time() - start_time)}s)")
 
@@ -171,7 +159,7 @@ def setup_mqtt():
             return True
         else:
             if mqtt_debug:
-                print(f"MQTT connection timed out after {connection_timeout} seconds")
+                print(f"MQTT connection timed out after {connection_timeout} seconds, still retrying in the background")
             return False
     except Exception as e:
         if mqtt_debug:
@@ -189,11 +177,6 @@ def publish_to_mqtt(data):
             print("MQTT client not initialized, cannot publish")
         return False
 
-    if not mqtt_connected:
-        if mqtt_debug:
-            print("MQTT client not connected, cannot publish")
-        return False
-
     try:
         # Convert data to JSON string
         json_data = json.dumps(data)
@@ -213,8 +196,12 @@ def publish_to_mqtt(data):
             print(f"Publishing to {mqtt_topic_publish} with QoS 1")
             print(f"Message size: {len(message_json)} bytes")
 
-        # Publish to topic with QoS 1 (at least once delivery)
-        result = mqtt_client.publish(mqtt_topic_publish, message_json, qos=1, retain=True)
+        # Publish to topic with QoS 1 (at least once delivery), buffering while disconnected
+        result = outbound_buffer.publish(mqtt_client, mqtt_topic_publish, message_json, qos=1, retain=True)
+        if result is None:
+            if mqtt_debug:
+                print(f"MQTT client not connected, buffered exchange rate data for replay ({outbound_buffer.get_stats()})")
+            return False
 
         # Wait for the message to be published
         if mqtt_debug:
@@ -553,11 +540,6 @@ def publish_message():
                     print("MQTT client not initialized, cannot publish user message")
                 return redirect("/")
 
-            if not mqtt_connected:
-                if mqtt_debug:
-                    print("MQTT client not connected, cannot publish user message")
-                return redirect("/")
-
             # Create a structured message with timestamp and sender info
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             structured_message = {
@@ -574,11 +556,16 @@ def publish_message():
                 print(f"Message: {message}")
                 print(f"Structured message: {message_json}")
 
-            # Publish the message with QoS 1
-            result = mqtt_client.publish(mqtt_topic_subscribe, message_json, qos=1)
+            # Publish the message with QoS 1, buffering while disconnected
+            result = outbound_buffer.publish(mqtt_client, mqtt_topic_subscribe, message_json, qos=1)
 
             # Also publish the raw message for simpler clients
-            mqtt_client.publish(mqtt_topic_subscribe, message, qos=1)
+            outbound_buffer.publish(mqtt_client, mqtt_topic_subscribe, message, qos=1)
+
+            if result is None:
+                if mqtt_debug:
+                    print("MQTT client not connected, buffered user message for replay")
+                return redirect("/")
 
             # Wait for the message to be published
             result.wait_for_publish(timeout=5)
@@ -612,7 +599,7 @@ if __name__ == "__main__":
     # Setup MQTT client
     mqtt_setup_success = setup_mqtt()
     if not mqtt_setup_success:
-        print("Warning: Failed to setup MQTT client. Continuing without MQTT functionality.")
+        print("Warning: MQTT broker not reachable yet. Exchange rate data is buffered until it connects.")
 
     # Fetch data from API
     api_data = fetch_api_data()
@@ -622,8 +609,8 @@ if __name__ == "__main__":
         json_file_path = save_to_json_file(api_data)
 
         if json_file_path:
-            # Publish data to MQTT if connected
-            if mqtt_connected:
+            # Publish data to MQTT, or buffer it until the client connects
+            if mqtt_client:
                 publish_success = publish_to_mqtt(api_data)
                 if publish_success:
                     print("Successfully published exchange rate data to MQTT")
@@ -642,5 +629,6 @@ if __name__ == "__main__":
             if mqtt_client:
                 mqtt_client.loop_stop()
                 mqtt_client.disconnect()
+            outbound_buffer.close()
     else:
         print("Failed to fetch data from API. Exiting.")
@@ -1,5 +1,14 @@
 import uuid
+import argparse
+import json
+import queue
+import threading
 import webbrowser
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+import requests
+from requests.adapters import HTTPAdapter
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
@@ -7,9 +16,12 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import paho.mqtt.client as mqtt
+from mqtt_common import broker_address, create_client, log_metrics_periodically
 import logging
 import time
 import os
+import sys
+import sqlite3
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -18,34 +30,295 @@ logger = logging.getLogger(__name__)
 # MQTT Configuration
 MQTT_BROKER = "192.168.8.6"  # Replace with your MQTT broker IP
 MQTT_PORT = 1883
+MQTT_METRICS_INTERVAL = 60  # Seconds between MQTT metrics log lines
 MQTT_TOPIC = "expo/test"
 MQTT_CLIENT_ID = f"gsmarena_search_scraper_{uuid.uuid4()}"  # Unique client ID
 
 # Selenium Configuration
 URL = "https://www.gsmarena.com/"
 SEARCH_TERM = "Cubot"  # Change to your desired brand (e.g., "Apple", "Xiaomi")
+# Performance mode blocks images, fonts and ad/tracker requests, returns from navigation at
+# DOMContentLoaded and replaces fixed sleeps with waits on the elements the scrape needs.
+PERFORMANCE_MODE = True
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*googlesyndication.com*", "*doubleclick.net*", "*googletagmanager.com*",
+    "*google-analytics.com*", "*adservice.google.*", "*amazon-adsystem.com*",
+    "*criteo.*", "*taboola.com*", "*outbrain.com*", "*facebook.net*", "*quantserve.com*",
+]
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# HTTP Fast Path Configuration
+# The search results page is fetched directly and Selenium is only used when it yields nothing.
+SEARCH_RESULTS_URL = "https://www.gsmarena.com/results.php3"
+HTTP_TIMEOUT = 10
+HTTP_CHUNK_SIZE = 16384  # Bytes fed to the parser at a time; parsing stops at the first result
+
+# Batch Mode Configuration
+# --batch FILE (or - for stdin) scrapes one search term per line with BATCH_WORKERS workers.
+BATCH_WORKERS = 4
+SITE_RATE_LIMIT = 1.0  # Requests per second to gsmarena.com across all workers
+SITE_RATE_BURST = 2  # Requests allowed back to back before the rate limit applies
+
+# Selector Ordering Configuration
+# Fallback selectors are tried in order of recent success, learned per site and kept on disk.
+SELECTOR_STATS_PATH = "selector_stats.json"
+SELECTOR_SCORE_WEIGHT = 0.3  # Weight of the newest outcome in a selector's moving success score
+SELECTOR_SAVE_EVERY = 20  # Persist the scores after this many recorded outcomes
+
+# Result Cache Configuration
+# First-result links are kept on disk per normalized search term. Fresh entries are
+# served without touching the site; stale ones are served and refreshed in the background.
+CACHE_PATH = "search_cache.db"
+CACHE_TTL = 24 * 3600  # Seconds before a cached link is revalidated
+CACHE_MAX_ENTRIES = 1000  # Least recently used entries are evicted beyond this
+
+# Service Mode Configuration
+# With --serve the scraper keeps warm drivers and answers search terms sent to
+# MQTT_REQUEST_TOPIC (plain text or {"id": ..., "term": ...}) on MQTT_RESPONSE_TOPIC.
+MQTT_REQUEST_TOPIC = "expo/search/requests"
+MQTT_RESPONSE_TOPIC = "expo/search/results"
+DRIVER_POOL_SIZE = 2  # Warm headless browsers, i.e. concurrent searches
+DRIVER_MAX_USES = 50  # Recycle a browser after this many searches
+MAX_SEARCH_TERM_LENGTH = 100
+
+service_mode = False
+phase_metrics = {}  # phase -> [count, total seconds, max seconds] across all scrapes
+phase_metrics_lock = threading.Lock()
+
+class RateLimiter:
+    """Token bucket shared by every worker that talks to the same site."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the caller may send its next request."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Reserve a token even if it is not there yet, so waiters are served in arrival order
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+site_rate_limiter = RateLimiter(SITE_RATE_LIMIT, SITE_RATE_BURST)
+
+class SelectorStats:
+    """Moving success scores of fallback selectors, used to try the likeliest selector first."""
+
+    def __init__(self, path, site):
+        self.path = path
+        self.site = site
+        self.lock = threading.Lock()
+        self.unsaved = 0
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.scores = json.load(f)
+        except (OSError, ValueError):
+            self.scores = {}
+
+    def ordered(self, group, selectors):
+        """Return selectors sorted by score, keeping the declared order for ties and new ones."""
+        with self.lock:
+            scores = self.scores.get(self.site, {}).get(group, {})
+            return sorted(selectors, key=lambda selector: -scores.get(selector, 0.0))
+
+    def record(self, group, selector, matched):
+        """Move a selector's score towards 1 on a match and towards 0 on a miss."""
+        with self.lock:
+            scores = self.scores.setdefault(self.site, {}).setdefault(group, {})
+            score = scores.get(selector, 0.0)
+            scores[selector] = score + SELECTOR_SCORE_WEIGHT * ((1.0 if matched else 0.0) - score)
+            self.unsaved += 1
+            save = self.unsaved >= SELECTOR_SAVE_EVERY
+        if save:
+            self.save()
+
+    def save(self):
+        """Write the scores to disk atomically."""
+        with self.lock:
+            if not self.unsaved:
+                return
+            data = json.dumps(self.scores, indent=4)
+            self.unsaved = 0
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to save selector statistics: {e}")
+
+selector_stats = SelectorStats(SELECTOR_STATS_PATH, urlparse(URL).netloc)
+
+def normalize_search_term(search_term):
+    """Normalize a search term so "  cubot" and "Cubot" share a cache entry."""
+    return " ".join(search_term.lower().split())
+
+class SearchResultCache:
+    """SQLite-backed search-term to first-result cache with TTL, LRU eviction and revalidation."""
+
+    def __init__(self, path, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.revalidating = set()
+        self.revalidations = set()  # Running revalidation threads
+        self.closing = False
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "revalidations": 0, "evictions": 0, "saved_ms": 0.0}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            create table if not exists search_cache (
+              term text primary key,
+              link text not null,
+              fetched_at real not null,
+              last_used real not null,
+              cost_ms real not null
+            );
+            create index if not exists search_cache_last_used on search_cache (last_used);
+        """)
+        self.conn.commit()
+
+    def lookup(self, term):
+        """Return (link, fetched_at, cost_ms) for a normalized term, or None."""
+        with self.lock:
+            row = self.conn.execute("select link, fetched_at, cost_ms from search_cache where term = ?",
+                                    (term,)).fetchone()
+            if row:
+                self.conn.execute("update search_cache set last_used = ? where term = ?", (time.time(), term))
+                self.conn.commit()
+        return row
+
+    def store(self, term, link, cost_ms):
+        """Insert or refresh an entry, evicting the least recently used beyond max_entries."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute("insert or replace into search_cache (term, link, fetched_at, last_used, cost_ms) "
+                              "values (?, ?, ?, ?, ?)", (term, link, now, now, cost_ms))
+            excess = self.conn.execute("select count(*) from search_cache").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.conn.execute("delete from search_cache where term in "
+                                  "(select term from search_cache order by last_used limit ?)", (excess,))
+                self.stats["evictions"] += excess
+            self.conn.commit()
+
+    def get_or_search(self, search_term, search):
+        """Serve a search from the cache, calling search(search_term) on a miss or to revalidate."""
+        term = normalize_search_term(search_term)
+        start = time.monotonic()
+        row = self.lookup(term)
+        if row is None:
+            with self.lock:
+                self.stats["misses"] += 1
+            result = search(search_term)
+            if result["link"]:
+                self.store(term, result["link"], result["elapsed_ms"])
+            return result
+
+        link, fetched_at, cost_ms = row
+        fresh = time.time() - fetched_at < self.ttl
+        with self.lock:
+            self.stats["hits" if fresh else "stale_hits"] += 1
+            self.stats["saved_ms"] += cost_ms
+            if not fresh and not self.closing and term not in self.revalidating:
+                self.revalidating.add(term)
+                thread = threading.Thread(target=self.revalidate, args=(term, search_term, search),
+                                          name=f"revalidate-{term}")
+                self.revalidations.add(thread)
+                thread.start()
+        return {
+            "term": search_term,
+            "link": link,
+            "source": "cache" if fresh else "stale-cache",
+            "queue_ms": 0.0,
+            "elapsed_ms": round((time.monotonic() - start) * 1000, 1),
+        }
+
+    def revalidate(self, term, search_term, search):
+        """Refresh a stale entry; the old link is kept if the refresh finds nothing."""
+        try:
+            result = search(search_term)
+            if result["link"]:
+                self.store(term, result["link"], result["elapsed_ms"])
+            with self.lock:
+                self.stats["revalidations"] += 1
+        except Exception as e:
+            logger.warning(f"Failed to revalidate cached result for '{search_term}': {e}")
+        finally:
+            with self.lock:
+                self.revalidating.discard(term)
+                self.revalidations.discard(threading.current_thread())
+
+    def stop_revalidations(self):
+        """Start no new revalidations and wait for the running ones, which may hold pooled drivers."""
+        with self.lock:
+            self.closing = True
+            threads = list(self.revalidations)
+        for thread in threads:
+            thread.join()
+
+    def report(self):
+        """Log hit ratio and wall time saved by the cache."""
+        with self.lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        hit_ratio = (stats["hits"] + stats["stale_hits"]) / lookups if lookups else 0.0
+        logger.info(f"Search cache: {lookups} lookups, hit ratio {hit_ratio:.0%} "
+                    f"({stats['hits']} fresh, {stats['stale_hits']} stale, {stats['misses']} misses), "
+                    f"{stats['revalidations']} revalidated, {stats['evictions']} evicted, "
+                    f"saved {stats['saved_ms'] / 1000:.1f}s of scraping")
+        return stats
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+search_cache = None  # Opened in main() unless --no-cache is given
+
+def cached_search(search, search_term):
+    """Run search(search_term) through the result cache when it is enabled."""
+    if search_cache is None:
+        return search(search_term)
+    return search_cache.get_or_search(search_term, search)
+
+def stop_revalidations():
+    """Wait for background revalidations so none of them uses a driver pool after it is closed."""
+    if search_cache is not None:
+        search_cache.stop_revalidations()
 
 def setup_mqtt_client():
     """Set up and connect MQTT client."""
     try:
-        client = mqtt.Client(client_id=MQTT_CLIENT_ID, clean_session=True)
+        client = create_client(MQTT_CLIENT_ID, clean_session=True)
         client.on_connect = on_connect
         client.on_publish = on_publish
-        client.connect(MQTT_BROKER, MQTT_PORT, 60)
+        client.connect(*broker_address(MQTT_BROKER, MQTT_PORT), 60)
         client.loop_start()
+        log_metrics_periodically(client, MQTT_METRICS_INTERVAL, logger.info)
         return client
     except Exception as e:
         logger.error(f"Failed to connect to MQTT broker: {e}")
         return None
 
-def on_connect(client, userdata, flags, rc):
+def on_connect(client, userdata, flags, rc, properties):
     """Callback for when the client connects to the broker."""
     if rc == 0:
         logger.info("Connected to MQTT broker")
+        if service_mode:
+            client.subscribe(MQTT_REQUEST_TOPIC, qos=1)
+            logger.info(f"Subscribed to {MQTT_REQUEST_TOPIC}")
     else:
         logger.error(f"Failed to connect to MQTT broker with code: {rc}")
 
-def on_publish(client, userdata, mid):
+def on_publish(client, userdata, mid, reason_code, properties):
     """Callback for when a message is published."""
     logger.info(f"Message {mid} published to {MQTT_TOPIC}")
 
@@ -57,47 +330,170 @@ def setup_selenium_driver():
         options.add_argument("--no-sandbox")
         options.add_argument("--disable-dev-shm-usage")
         options.add_argument("--disable-gpu")
-        options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+        options.add_argument(f"user-agent={USER_AGENT}")
         options.add_argument("--disable-blink-features=AutomationControlled")
         options.add_argument("--window-size=1920,1080")
+        if PERFORMANCE_MODE:
+            options.page_load_strategy = "eager"
+            options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
         driver = webdriver.Chrome(options=options)
+        if PERFORMANCE_MODE:
+            # Images are already off via prefs; CDP also drops fonts and third-party ad/tracker requests
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
         return driver
     except Exception as e:
         logger.error(f"Failed to set up Selenium driver: {e}")
         return None
 
+class FirstResultParser(HTMLParser):
+    """Streaming parser that stops at the first link inside a div.makers or div.listing list item."""
+
+    RESULT_CONTAINERS = {"makers", "listing"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.div_depth = 0
+        self.container_depth = None  # div_depth of the enclosing results container
+        self.in_item = False
+        self.first_href = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.first_href is not None:
+            return
+        if tag == "div":
+            self.div_depth += 1
+            classes = (dict(attrs).get("class") or "").split()
+            if self.container_depth is None and self.RESULT_CONTAINERS.intersection(classes):
+                self.container_depth = self.div_depth
+        elif self.container_depth is not None:
+            if tag == "li":
+                self.in_item = True
+            elif tag == "a" and self.in_item:
+                self.first_href = dict(attrs).get("href")
+
+    def handle_endtag(self, tag):
+        if tag == "div":
+            if self.container_depth == self.div_depth:
+                self.container_depth = None
+            self.div_depth -= 1
+        elif tag == "li":
+            self.in_item = False
+
+def parse_first_result(chunks):
+    """Return the absolute link of the first search result in an iterable of HTML text chunks."""
+    parser = FirstResultParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        if parser.first_href:
+            break
+    if not parser.first_href:
+        return None
+    return urljoin(URL, parser.first_href)
+
+def create_http_session():
+    """Create a pooled HTTP session for the search results page."""
+    session = requests.Session()
+    session.headers["User-Agent"] = USER_AGENT
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(DRIVER_POOL_SIZE, 4))
+    session.mount("https://", adapter)
+    return session
+
+http_session = create_http_session()
+
+def fetch_first_result_http(search_term):
+    """Fetch the search results page over HTTP and return the first result link, or None."""
+    site_rate_limiter.acquire()
+    try:
+        with http_session.get(SEARCH_RESULTS_URL, params={"sQuickSearch": "yes", "sName": search_term},
+                              timeout=HTTP_TIMEOUT, stream=True) as response:
+            response.raise_for_status()
+            response.encoding = response.encoding or "utf-8"
+            first_link = parse_first_result(
+                response.iter_content(chunk_size=HTTP_CHUNK_SIZE, decode_unicode=True))
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"HTTP fast path failed for '{search_term}': {e}")
+        return None
+    if first_link:
+        logger.info(f"First result link (HTTP): {first_link}")
+    return first_link
+
+def record_phase(timings, phase, start):
+    """Record the time since start for a scrape phase, per scrape and in the global metrics."""
+    elapsed = time.perf_counter() - start
+    timings[phase] = elapsed
+    with phase_metrics_lock:
+        metrics = phase_metrics.setdefault(phase, [0, 0.0, 0.0])
+        metrics[0] += 1
+        metrics[1] += elapsed
+        metrics[2] = max(metrics[2], elapsed)
+
+def report_phase_metrics():
+    """Log average and worst time per scrape phase and name the slowest one."""
+    with phase_metrics_lock:
+        metrics = {phase: list(values) for phase, values in phase_metrics.items()}
+    if not metrics:
+        return
+    for phase, (count, total, worst) in metrics.items():
+        logger.info(f"Phase {phase}: {count} runs, avg {total / count * 1000:.0f} ms, max {worst * 1000:.0f} ms")
+    slowest = max(metrics, key=lambda phase: metrics[phase][1] / metrics[phase][0])
+    logger.info(f"Slowest phase on average: {slowest}")
+
 def scrape_first_result(driver, search_term):
     """Search for a phone brand on GSMArena and return the link of the first result."""
+    timings = {}
+    try:
+        return scrape_first_result_timed(driver, search_term, timings)
+    finally:
+        if timings:
+            logger.info(f"Phase timings for '{search_term}': " +
+                        ", ".join(f"{phase} {elapsed * 1000:.0f} ms" for phase, elapsed in timings.items()))
+
+def scrape_first_result_timed(driver, search_term, timings):
+    """Run the Selenium search, recording the duration of each phase in timings."""
+    search_input_selectors = [
+        "input#topsearch-text",
+        "input.form-control",
+        "input[type='text']",
+        "input[name='sSearch']"
+    ]
     try:
         logger.info(f"Navigating to {URL}")
+        phase_start = time.perf_counter()
         for attempt in range(3):
             try:
+                site_rate_limiter.acquire()
                 driver.get(URL)
-                WebDriverWait(driver, 20).until(
-                    lambda d: d.execute_script("return document.readyState") == "complete"
-                )
+                if PERFORMANCE_MODE:
+                    # Only the search box is needed, not every image, ad and stylesheet
+                    WebDriverWait(driver, 20).until(
+                        EC.presence_of_element_located((By.CSS_SELECTOR, ", ".join(search_input_selectors)))
+                    )
+                else:
+                    WebDriverWait(driver, 20).until(
+                        lambda d: d.execute_script("return document.readyState") == "complete"
+                    )
                 break
             except Exception as e:
                 logger.warning(f"Retry {attempt+1}/3: Failed to load page: {e}")
                 time.sleep(2)
         else:
             raise Exception("Failed to load page after retries")
+        record_phase(timings, "navigate", phase_start)
         
         # Find and interact with search bar
-        search_input_selectors = [
-            "input#topsearch-text",
-            "input.form-control",
-            "input[type='text']",
-            "input[name='sSearch']"
-        ]
+        phase_start = time.perf_counter()
         search_input = None
-        for selector in search_input_selectors:
+        for selector in selector_stats.ordered("search_input", search_input_selectors):
             try:
                 search_input = driver.find_element(By.CSS_SELECTOR, selector)
+                selector_stats.record("search_input", selector, True)
                 logger.info(f"Found search input with selector: {selector}")
                 break
             except:
+                selector_stats.record("search_input", selector, False)
                 continue
+        record_phase(timings, "search_input", phase_start)
         
         if not search_input:
             logger.error("Search input not found. Saving page source and screenshot.")
@@ -108,49 +504,54 @@ def scrape_first_result(driver, search_term):
         
         # Enter search term and submit
         logger.info(f"Searching for: {search_term}")
+        phase_start = time.perf_counter()
         search_input.clear()
         search_input.send_keys(search_term)
-        time.sleep(1)  # Mimic human typing
+        if PERFORMANCE_MODE:
+            WebDriverWait(driver, 5).until(lambda d: search_input.get_attribute("value") == search_term)
+        else:
+            time.sleep(1)  # Mimic human typing
         search_input.send_keys(Keys.ENTER)
         
         # Wait for search results
         WebDriverWait(driver, 20).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, "div.makers, div#review-body, div.listing"))
         )
+        record_phase(timings, "results_wait", phase_start)
         
-        # Find the first phone element
+        phase_start = time.perf_counter()
+        # Find the first phone element. Only the result-list selectors are ranked; the
+        # catch-all also matches the header menu, so it stays last and is never scored
         result_selectors = [
             "div.makers ul li",
             "div#review-body div.makers li",
             "div.listing li",
-            "ul li a"
         ]
-        first_element = None
-        for selector in result_selectors:
+        fallback_selector = "ul li a"
+        first_link = None
+        missed = []
+        for selector in selector_stats.ordered("result", result_selectors) + [fallback_selector]:
             elements = driver.find_elements(By.CSS_SELECTOR, selector)
-            if elements:
-                first_element = elements[0]
+            first_link = extract_result_link(elements[0]) if elements else None
+            if first_link:
                 logger.info(f"Found first element with selector: {selector}")
+                if selector != fallback_selector:
+                    # Only a page that really had a result says anything about the other selectors
+                    selector_stats.record("result", selector, True)
+                    for missed_selector in missed:
+                        selector_stats.record("result", missed_selector, False)
                 break
-        
-        if not first_element:
+            missed.append(selector)
+
+        if not first_link:
             logger.error("No search results found. Saving page source and screenshot.")
             with open("page_source.html", "w", encoding="utf-8") as f:
                 f.write(driver.page_source)
             driver.save_screenshot("error_screenshot.png")
             return None
-        
-        # Extract the link from the first element
-        try:
-            link_element = first_element.find_element(By.CSS_SELECTOR, "a")
-            first_link = link_element.get_attribute("href")
-            if not first_link.startswith("http"):
-                first_link = "https://www.gsmarena.com/" + first_link
-            logger.info(f"First result link: {first_link}")
-            return first_link
-        except Exception as e:
-            logger.warning(f"Could not extract link from first result: {e}")
-            return None
+        record_phase(timings, "link_extraction", phase_start)
+        logger.info(f"First result link: {first_link}")
+        return first_link
     except Exception as e:
         logger.error(f"Error during scraping: {e}")
         with open("page_source.html", "w", encoding="utf-8") as f:
@@ -158,38 +559,391 @@ def scrape_first_result(driver, search_term):
         driver.save_screenshot("error_screenshot.png")
         return None
 
+def extract_result_link(element):
+    """Return the absolute link of a result element, or of the first link inside it, or None."""
+    try:
+        link = element if element.tag_name == "a" else element.find_element(By.CSS_SELECTOR, "a")
+        href = link.get_attribute("href")
+    except Exception as e:
+        logger.warning(f"Could not extract link from first result: {e}")
+        return None
+    if not href:
+        return None
+    return href if href.startswith("http") else "https://www.gsmarena.com/" + href
+
+class DriverPool:
+    """Pool of Selenium drivers, each recycled after DRIVER_MAX_USES searches or an error.
+
+    A warm pool starts every browser up front; otherwise browsers start on first demand.
+    """
+
+    def __init__(self, size, max_uses, warm=True):
+        self.size = size
+        self.max_uses = max_uses
+        self.warm = warm
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.created = 0
+        self.closed = False
+        if warm:
+            entries = []
+            try:
+                for _ in range(size):
+                    entries.append(self.new_entry())
+            except Exception:
+                # Do not leave the browsers that did start running
+                for driver, _ in entries:
+                    self.quit_driver(driver)
+                raise
+            for entry in entries:
+                self.idle.put(entry)
+            self.created = size
+
+    def new_entry(self):
+        """Start a browser and return its [driver, uses] pool entry."""
+        driver = setup_selenium_driver()
+        if driver is None:
+            raise RuntimeError("Failed to start Selenium driver")
+        return [driver, 0]
+
+    def acquire(self):
+        """Block until a driver is free and return its pool entry; raises RuntimeError once closed."""
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("Driver pool is closed")
+            start_new = self.created < self.size
+            if start_new:
+                self.created += 1
+        if not start_new:
+            # Wake up now and then so a waiter does not outlive close()
+            while True:
+                try:
+                    return self.idle.get(timeout=1)
+                except queue.Empty:
+                    if self.closed:
+                        raise RuntimeError("Driver pool is closed")
+        try:
+            entry = self.new_entry()
+        except Exception:
+            with self.lock:
+                self.created -= 1
+            raise
+        if self.closed:
+            self.quit_driver(entry[0])
+            raise RuntimeError("Driver pool is closed")
+        return entry
+
+    def release(self, entry, ok):
+        """Return a driver to the pool, replacing it if it failed or is worn out."""
+        entry[1] += 1
+        if not ok or entry[1] >= self.max_uses:
+            logger.info(f"Recycling driver after {entry[1]} uses ({'ok' if ok else 'error'})")
+            self.quit_driver(entry[0])
+            if not self.warm or self.closed:
+                # Cold pools start the replacement on the next acquire
+                with self.lock:
+                    self.created -= 1
+                return
+            try:
+                entry = self.new_entry()
+            except Exception as e:
+                # Keep the pool size stable; the next acquire gets a fresh retry
+                logger.error(f"Failed to replace driver: {e}")
+                threading.Timer(5, self.refill).start()
+                return
+        self.put_idle(entry)
+
+    def put_idle(self, entry):
+        """Make a driver available again, or quit it if the pool has been closed meanwhile."""
+        with self.lock:
+            # Under the lock, so close() either sees this entry or has already set closed
+            if not self.closed:
+                self.idle.put(entry)
+                return
+        self.quit_driver(entry[0])
+
+    def quit_driver(self, driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"Error quitting driver: {e}")
+
+    def refill(self):
+        """Start a replacement driver after a failed recycle."""
+        if self.closed:
+            return
+        try:
+            self.put_idle(self.new_entry())
+        except Exception as e:
+            logger.error(f"Failed to replace driver: {e}")
+            threading.Timer(5, self.refill).start()
+
+    def close(self):
+        """Quit every idle driver; drivers released afterwards are quit instead of pooled."""
+        with self.lock:
+            self.closed = True
+        while True:
+            try:
+                entry = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self.quit_driver(entry[0])
+
+def is_driver_alive(driver):
+    """Check whether a driver's browser session still responds."""
+    try:
+        driver.execute_script("return 1")
+        return True
+    except Exception:
+        return False
+
+def parse_search_request(payload):
+    """Parse a request payload into (request_id, search_term)."""
+    text = payload.decode().strip()
+    try:
+        request = json.loads(text)
+    except ValueError:
+        request = None
+    if isinstance(request, dict):
+        return str(request.get("id") or uuid.uuid4().hex[:8]), str(request.get("term", "")).strip()
+    return uuid.uuid4().hex[:8], text
+
+def search_with_fallback(driver_pool, search_term):
+    """Find the first result over HTTP, falling back to a pooled Selenium driver.
+
+    Returns a dict with the link, the path that served it and timings.
+    """
+    start = time.monotonic()
+    waited = 0.0
+    link = fetch_first_result_http(search_term)
+    source = "http"
+    if not link:
+        source = "selenium"
+        try:
+            entry = driver_pool.acquire()
+        except Exception as e:
+            logger.error(f"No Selenium driver available for '{search_term}': {e}")
+            return {"term": search_term, "link": None, "source": source, "queue_ms": 0.0,
+                    "elapsed_ms": round((time.monotonic() - start) * 1000, 1)}
+        waited = time.monotonic() - start
+        try:
+            link = scrape_first_result(entry[0], search_term)
+        except Exception as e:
+            logger.error(f"Error searching for '{search_term}': {e}")
+        finally:
+            # No link can mean no results or a crashed browser; only the latter needs a recycle
+            driver_pool.release(entry, ok=link is not None or is_driver_alive(entry[0]))
+    return {
+        "term": search_term,
+        "link": link,
+        "source": source,
+        "queue_ms": round(waited * 1000, 1),
+        "elapsed_ms": round((time.monotonic() - start) * 1000, 1),
+    }
+
+def handle_search_request(client, driver_pool, request_id, search_term):
+    """Serve one search request with a pooled driver and publish the result."""
+    # Runs on an executor whose futures nobody checks, so every failure is logged and answered here
+    try:
+        response = {"id": request_id}
+        response.update(cached_search(lambda term: search_with_fallback(driver_pool, term), search_term))
+        client.publish(MQTT_RESPONSE_TOPIC, json.dumps(response), qos=1)
+        logger.info(f"Answered search request {request_id} for '{search_term}' via {response['source']} in {response['elapsed_ms']} ms")
+    except Exception as e:
+        logger.error(f"Error serving search request {request_id} for '{search_term}': {e}")
+        try:
+            client.publish(MQTT_RESPONSE_TOPIC, json.dumps(
+                {"id": request_id, "term": search_term, "link": None, "error": f"Search failed: {e}"}), qos=1)
+        except Exception as e:
+            logger.error(f"Error publishing failure response for request {request_id}: {e}")
+
+def read_search_terms(path):
+    """Yield non-empty search terms, one per line, from a file or stdin ("-")."""
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        for line in stream:
+            term = line.strip()
+            if term and len(term) <= MAX_SEARCH_TERM_LENGTH:
+                yield term
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def run_batch(mqtt_client, terms, workers):
+    """Scrape a stream of search terms concurrently, emitting JSON lines and publishing each result."""
+    driver_pool = DriverPool(workers, DRIVER_MAX_USES, warm=False)
+    # Bound the number of queued terms so a large or endless stream is not read ahead
+    slots = threading.Semaphore(workers * 2)
+    output_lock = threading.Lock()
+    stats = {"terms": 0, "found": 0, "http": 0, "selenium": 0, "cache": 0, "stale-cache": 0}
+    start = time.monotonic()
+
+    def scrape(term):
+        try:
+            result = cached_search(lambda t: search_with_fallback(driver_pool, t), term)
+            line = json.dumps(result)
+            with output_lock:
+                print(line, flush=True)
+                stats["terms"] += 1
+                stats["found"] += result["link"] is not None
+                stats[result["source"]] += 1
+            mqtt_client.publish(MQTT_TOPIC, line, qos=1)
+        except Exception as e:
+            logger.error(f"Error scraping '{term}': {e}")
+        finally:
+            slots.release()
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+    try:
+        for term in terms:
+            slots.acquire()
+            executor.submit(scrape, term)
+    finally:
+        executor.shutdown(wait=True)
+        stop_revalidations()
+        driver_pool.close()
+
+    elapsed = time.monotonic() - start
+    rate = stats["terms"] / elapsed if elapsed else 0.0
+    logger.info(f"Batch finished: {stats['terms']} terms, {stats['found']} found "
+                f"({stats['http']} via HTTP, {stats['selenium']} via Selenium, "
+                f"{stats['cache'] + stats['stale-cache']} from cache) in {elapsed:.1f}s, {rate:.2f} terms/s")
+    return stats
+
+def run_service(mqtt_client):
+    """Serve search requests from MQTT with a pool of warm drivers until interrupted."""
+    global service_mode
+    logger.info(f"Starting {DRIVER_POOL_SIZE} warm drivers")
+    try:
+        driver_pool = DriverPool(DRIVER_POOL_SIZE, DRIVER_MAX_USES)
+    except RuntimeError as e:
+        logger.error(f"Exiting due to Selenium setup failure: {e}")
+        return
+    executor = ThreadPoolExecutor(max_workers=DRIVER_POOL_SIZE, thread_name_prefix="search")
+
+    def on_message(client, userdata, msg):
+        # paho re-raises callback exceptions from its network thread, which would stop the service
+        request_id, search_term = uuid.uuid4().hex[:8], None
+        try:
+            request_id, search_term = parse_search_request(msg.payload)
+            if not search_term or len(search_term) > MAX_SEARCH_TERM_LENGTH:
+                client.publish(MQTT_RESPONSE_TOPIC, json.dumps(
+                    {"id": request_id, "term": search_term, "link": None, "error": "Invalid search term"}), qos=1)
+                return
+            # Hand off to a worker so the MQTT network thread never waits on a browser
+            executor.submit(handle_search_request, client, driver_pool, request_id, search_term)
+        except Exception as e:
+            logger.error(f"Error handling search request {request_id}: {e}")
+            try:
+                client.publish(MQTT_RESPONSE_TOPIC, json.dumps(
+                    {"id": request_id, "term": search_term, "link": None, "error": f"Request failed: {e}"}), qos=1)
+            except Exception as e:
+                logger.error(f"Error publishing failure response for request {request_id}: {e}")
+
+    mqtt_client.on_message = on_message
+    service_mode = True
+    mqtt_client.subscribe(MQTT_REQUEST_TOPIC, qos=1)
+    logger.info(f"Serving search requests from {MQTT_REQUEST_TOPIC}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logger.info("Shutting down")
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        stop_revalidations()
+        driver_pool.close()
+
+def search_without_pool(search_term):
+    """Find the first result for a one-off search, starting a browser only if HTTP finds nothing."""
+    start = time.monotonic()
+    link = fetch_first_result_http(search_term)
+    source = "http"
+    if not link:
+        logger.info("HTTP fast path found nothing, falling back to Selenium")
+        source = "selenium"
+        driver = setup_selenium_driver()
+        if not driver:
+            logger.error("Selenium setup failed")
+        else:
+            try:
+                link = scrape_first_result(driver, search_term)
+            finally:
+                driver.quit()
+    return {
+        "term": search_term,
+        "link": link,
+        "source": source,
+        "queue_ms": 0.0,
+        "elapsed_ms": round((time.monotonic() - start) * 1000, 1),
+    }
+
 def main():
     """Main function to scrape the first result, open it in Chrome, and publish to MQTT."""
+    parser = argparse.ArgumentParser(description="GSMArena first-result scraper publishing to MQTT")
+    parser.add_argument("--serve", action="store_true", help="Keep warm drivers and serve search requests from MQTT")
+    parser.add_argument("--parse-file", metavar="HTML", help="Print the first result link of a saved results page and exit")
+    parser.add_argument("--batch", metavar="FILE", help="Scrape one search term per line from FILE (- for stdin)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="Concurrent workers in batch mode")
+    parser.add_argument("--no-cache", action="store_true", help="Always scrape instead of using the result cache")
+    parser.add_argument("--full-page-load", action="store_true",
+                        help="Disable performance mode: load every resource and use the fixed sleeps")
+    args = parser.parse_args()
+
+    global PERFORMANCE_MODE
+    if args.full_page_load:
+        PERFORMANCE_MODE = False
+
+    if args.parse_file:
+        # Offline check of the fast-path parser against a saved page (e.g. a page_source.html dump)
+        with open(args.parse_file, encoding="utf-8") as f:
+            print(parse_first_result(iter(lambda: f.read(HTTP_CHUNK_SIZE), "")))
+        return
+
     mqtt_client = setup_mqtt_client()
     if not mqtt_client:
         logger.error("Exiting due to MQTT setup failure")
         return
-    
-    driver = setup_selenium_driver()
-    if not driver:
-        mqtt_client.loop_stop()
-        mqtt_client.disconnect()
-        logger.error("Exiting due to Selenium setup failure")
-        return
-    
+
+    global search_cache
+    if not args.no_cache:
+        search_cache = SearchResultCache(CACHE_PATH, CACHE_TTL, CACHE_MAX_ENTRIES)
+
     try:
-        first_link = scrape_first_result(driver, SEARCH_TERM)
-        if first_link:
-            # Open the link in the default browser (assumed to be Chrome)
-            logger.info(f"Opening the first result in Chrome: {first_link}")
-            webbrowser.open(first_link)
-            
-            # Publish the link to MQTT
-            result = mqtt_client.publish(MQTT_TOPIC, first_link, qos=1)
-            if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                logger.info(f"Published first link to {MQTT_TOPIC}: {first_link}")
-            else:
-                logger.error(f"Failed to publish to MQTT: {result.rc}")
+        if args.batch:
+            run_batch(mqtt_client, read_search_terms(args.batch), max(1, args.workers))
+        elif args.serve:
+            run_service(mqtt_client)
         else:
-            logger.warning("No link to publish or open")
+            result = cached_search(search_without_pool, SEARCH_TERM)
+            first_link = result["link"]
+            logger.info(f"Search for '{SEARCH_TERM}' served via {result['source']}")
+            if first_link:
+                # Open the link in the default browser (assumed to be Chrome)
+                logger.info(f"Opening the first result in Chrome: {first_link}")
+                webbrowser.open(first_link)
+                
+                # Publish the link to MQTT
+                publish_result = mqtt_client.publish(MQTT_TOPIC, first_link, qos=1)
+                if publish_result.rc == mqtt.MQTT_ERR_SUCCESS:
+                    logger.info(f"Published first link to {MQTT_TOPIC}: {first_link}")
+                else:
+                    logger.error(f"Failed to publish to MQTT: {publish_result.rc}")
+            else:
+                logger.warning("No link to publish or open")
     
     finally:
-        driver.quit()
+        if search_cache is not None:
+            # Let background revalidations finish before the cache is closed
+            search_cache.stop_revalidations()
+            search_cache.report()
+            search_cache.close()
+        report_phase_metrics()
+        selector_stats.save()
         mqtt_client.loop_stop()
         mqtt_client.disconnect()
         logger.info("Script execution completed")
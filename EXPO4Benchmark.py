@@ -0,0 +1,236 @@
+import argparse
+import json
+import logging
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import paramiko
+
+import EXPO4Laboratorinis as agent
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Canned outputs of the stand-in SSH server, shaped like a small Linux VM
+STANDIN_OUTPUTS = {
+    "ls": "Desktop\nDocuments\nDownloads\nnotes.txt\nscripts",
+    "ip addr show": (
+        "1: lo: <LOOPBACK,UP,LOWER_UP> mtu 65536 qdisc noqueue state UNKNOWN\n"
+        "    inet 127.0.0.1/8 scope host lo\n"
+        "2: enp0s3: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 qdisc fq_codel state UP\n"
+        "    inet 192.168.8.16/24 brd 192.168.8.255 scope global dynamic enp0s3"
+    ),
+    "free -m | grep Mem": "Mem:           3931        1204        1650          12        1076        2468",
+}
+
+CHANNEL_CLOSE_GRACE = 0.05  # Seconds between sending EOF and closing a stand-in channel
+
+# Execution modes compared by the benchmark: (SSH pool size, result cache TTLs)
+BENCHMARK_MODES = {
+    "baseline": (0, {}),
+    "pooled": (None, {}),  # None sizes the pool to the concurrency level
+    "cached": (0, agent.COMMAND_CACHE_TTL),
+    "pooled+cached": (None, agent.COMMAND_CACHE_TTL),
+}
+
+class StandInSSHServer(paramiko.ServerInterface):
+    """Accepts any password and answers exec requests with canned command output."""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED_OPEN_FAILED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self.respond, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+    def respond(self, channel, command):
+        """Send the canned output of a command and close the channel."""
+        if self.delay:
+            time.sleep(self.delay)
+        if command.startswith("echo "):
+            output = ""  # Command 4 redirects its output into a file
+        else:
+            output = STANDIN_OUTPUTS.get(command, "")
+        channel.sendall(output.encode())
+        channel.send_exit_status(0)
+        channel.shutdown_write()
+        # The exec reply is sent after check_channel_exec_request returns, so closing right
+        # away can beat it. EOF already completes the command for the client; close later.
+        time.sleep(CHANNEL_CLOSE_GRACE)
+        channel.close()
+
+class StandInSSHListener:
+    """In-process SSH server on a loopback port, counting accepted connections."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(128)
+        self.port = self.sock.getsockname()[1]
+        self.connections = 0
+        self.transports = []
+
+    def serve_forever(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return  # Listener closed
+            self.connections += 1
+            # Small exec replies otherwise sit behind Nagle/delayed-ACK timers on loopback
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(self.host_key)
+            transport.start_server(server=StandInSSHServer(self.delay))
+            self.transports.append(transport)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.sock.close()
+        for transport in self.transports:
+            transport.close()
+
+class FakeBroker:
+    """Stands in for the MQTT client passed to on_message, timestamping every publish."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.published = []
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        with self.lock:
+            self.published.append((time.perf_counter(), topic, payload))
+
+def instrument_ssh_connect():
+    """Wrap paramiko's connect to record SSH setup time. Returns the list of durations."""
+    durations = []
+    original_connect = paramiko.SSHClient.connect
+
+    def timed_connect(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original_connect(self, *args, **kwargs)
+        finally:
+            durations.append(time.perf_counter() - start)
+
+    paramiko.SSHClient.connect = timed_connect
+    return durations
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of a list of values."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def run_scenario(listener, connect_durations, mode, concurrency, commands, count):
+    """Fire count commands drawn from commands at the agent and return the measured stats."""
+    pool_size, ttls = BENCHMARK_MODES[mode]
+    agent.ssh_pool.close_all()
+    agent.ssh_pool = agent.SSHConnectionPool(concurrency if pool_size is None else pool_size)
+    agent.result_cache = agent.CommandResultCache(ttls)
+    broker = FakeBroker()
+    connections_before = listener.connections
+    setup_before = len(connect_durations)
+    workload = [random.choice(commands) for _ in range(count)]
+
+    def fire(command):
+        msg = SimpleNamespace(topic=agent.MQTT_COMMAND_TOPIC, payload=command.encode())
+        start = time.perf_counter()
+        agent.on_message(broker, None, msg)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(fire, workload))
+    elapsed = time.perf_counter() - start
+
+    failures = sum(1 for _, _, payload in broker.published if agent.is_failed_result(payload))
+    setup_times = connect_durations[setup_before:]
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "commands": count,
+        "failures": failures,
+        "commands_per_s": round(count / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "ssh_connections": listener.connections - connections_before,
+        "ssh_setup_ms_per_command": round(sum(setup_times) * 1000 / count, 2),
+        "cache": agent.result_cache.get_stats(),
+    }
+
+def main():
+    """Run every selected mode and concurrency level against the stand-in server."""
+    parser = argparse.ArgumentParser(description="Offline throughput/latency benchmark of the SSH system agent")
+    parser.add_argument("--commands", default="1,2,3,4", help="Comma-separated command mix, repeat to weight (e.g. 1,1,3,4)")
+    parser.add_argument("--count", type=int, default=200, help="Commands per scenario")
+    parser.add_argument("--concurrency", default="1,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--modes", default=",".join(BENCHMARK_MODES), help="Comma-separated execution modes")
+    parser.add_argument("--server-delay", type=float, default=0.0, help="Simulated remote command runtime in ms")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the command mix")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON lines")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    commands = [c.strip() for c in args.commands.split(",") if c.strip()]
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in BENCHMARK_MODES]
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(unknown)}")
+
+    # Point the agent at the stand-in server and keep its per-command logging quiet
+    listener = StandInSSHListener(delay=args.server_delay / 1000)
+    listener.start()
+    agent.VM_HOST = "127.0.0.1"
+    agent.VM_PORT = listener.port
+    agent.PROBE_BACKEND = "ssh"
+    agent.logger.setLevel(logging.WARNING)
+    # Clients dropping connections at scenario end make the server transports log resets
+    logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+    connect_durations = instrument_ssh_connect()
+    logger.info(f"Stand-in SSH server listening on 127.0.0.1:{listener.port}")
+
+    try:
+        results = []
+        for mode in modes:
+            for concurrency in [int(c) for c in args.concurrency.split(",")]:
+                result = run_scenario(listener, connect_durations, mode, concurrency, commands, args.count)
+                results.append(result)
+                if args.json:
+                    print(json.dumps(result))
+                else:
+                    logger.info(f"{mode:>14} x{concurrency:<3} {result['commands_per_s']:>8} cmd/s  "
+                                f"p50 {result['p50_ms']:>7} ms  p99 {result['p99_ms']:>7} ms  "
+                                f"ssh setup {result['ssh_setup_ms_per_command']:>6} ms/cmd  "
+                                f"connections {result['ssh_connections']:>4}  failures {result['failures']}")
+        if not args.json and results:
+            best = max(results, key=lambda r: r["commands_per_s"])
+            baseline = results[0]
+            speedup = best["commands_per_s"] / baseline["commands_per_s"]
+            logger.info(f"Best: {best['mode']} x{best['concurrency']} ({speedup:.1f}x the first scenario)")
+    finally:
+        agent.ssh_pool.close_all()
+        listener.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,18 @@
 import uuid
-import paho.mqtt.client as mqtt
+import json
+import codecs
+import fcntl
+import os
+import socket
+import struct
+import threading
+from mqtt_common import broker_address, create_client, log_metrics_periodically
 import logging
 import time
 import paramiko
+import paho.mqtt.client as mqtt
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -11,6 +21,7 @@ logger = logging.getLogger(__name__)
 # MQTT Configuration
 MQTT_BROKER = "192.168.8.16"
 MQTT_PORT = 1883
+MQTT_METRICS_INTERVAL = 60  # Seconds between MQTT metrics log lines
 MQTT_COMMAND_TOPIC = "expo/test"
 MQTT_RESULT_TOPIC = "expo/test/results"
 MQTT_CLIENT_ID = f"system_agent_{uuid.uuid4()}"
@@ -19,38 +30,301 @@ MQTT_CLIENT_ID = f"system_agent_{uuid.uuid4()}"
 VM_HOST = "192.168.8.16"  # Replace with your VM's IP address
 VM_USERNAME = "madcat"  # Replace with your VM's SSH username
 VM_PASSWORD = "madcat"  # Replace with your VM's SSH password
+VM_PORT = 22  # SSH port of the VM
+SSH_CONNECT_TIMEOUT = 10  # Seconds before an unreachable host is given up on
+SSH_COMMAND_TIMEOUT = 30  # Seconds a running command may go without producing output
+SSH_POOL_SIZE = 4  # Idle SSH connections kept open per host for reuse (0 connects per command)
+
+# Fleet Configuration
+# A command addressed as "<group>:<command>" (e.g. "lab:2") runs on every host
+# of the group in parallel. Plain commands ("2") still target VM_HOST only.
+HOST_GROUPS = {
+    "lab": ["192.168.8.16"],
+}
+FANOUT_MAX_WORKERS = 8  # Upper bound on concurrent SSH sessions per agent
+FANOUT_TIMEOUT = 60  # Seconds before hosts still running are reported as failed in the summary
+MQTT_FLEET_RESULT_TOPIC = f"{MQTT_RESULT_TOPIC}/fleet"
+
+fanout_executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS, thread_name_prefix="fanout")
+
+# Result Cache Configuration
+# Read-only commands are cached per host for this many seconds (0 disables caching).
+COMMAND_CACHE_TTL = {
+    "1": 5,   # ls
+    "2": 60,  # ip addr show
+    "3": 2,   # free -m
+}
+# Mutating commands and the cached commands whose results they make stale
+COMMAND_INVALIDATES = {
+    "4": ["1"],
+}
+
+# Streaming Configuration
+# "stream <command>" publishes the raw output of a read-only command in chunks
+# as it arrives instead of waiting for the command to exit.
+STREAM_SHELL_COMMANDS = {
+    "1": "ls",
+    "2": "ip addr show",
+    "3": "free -m",
+}
+STREAM_CHUNK_SIZE = 4096  # Publish once this many bytes are buffered
+STREAM_FLUSH_INTERVAL = 0.2  # ...or once the oldest buffered byte is this many seconds old
+STREAM_STDERR_LIMIT = 4096  # Only the tail of stderr is kept for the end-of-stream marker
+STREAM_MAX_INFLIGHT = 8  # Chunks published but not yet acknowledged before the stream waits for the broker
+STREAM_ACK_TIMEOUT = 30  # Seconds a chunk may wait for its acknowledgement before the stream is failed
+MQTT_STREAM_TOPIC = f"{MQTT_RESULT_TOPIC}/stream"
 
-def ssh_execute_command(command):
-    """Execute a command on the Linux VM via SSH."""
+# Local Probe Configuration
+# "local" reads /proc and the network interfaces directly instead of SSHing in,
+# "ssh" always uses SSH, "auto" probes locally when the target host is this machine.
+PROBE_BACKEND = "auto"
+LOCAL_WORKDIR = os.path.expanduser("~")  # Directory listed/written by commands 1 and 4
+LOCAL_HOST_NAMES = {"localhost", "127.0.0.1", "::1"}
+
+# Telemetry Configuration
+TELEMETRY_INTERVAL = 10  # Seconds between local metric pushes (0 disables telemetry)
+MQTT_TELEMETRY_TOPIC = f"{MQTT_RESULT_TOPIC}/telemetry"
+SIOCGIFADDR = 0x8915  # Linux ioctl returning an interface's IPv4 address
+
+telemetry_stop = threading.Event()
+
+def open_ssh_connection(host):
+    """Open an authenticated SSH connection to a Linux VM."""
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(VM_HOST, username=VM_USERNAME, password=VM_PASSWORD)
-        stdin, stdout, stderr = ssh.exec_command(command)
-        output = stdout.read().decode().strip()
-        error = stderr.read().decode().strip()
+        ssh.connect(host, port=VM_PORT, username=VM_USERNAME, password=VM_PASSWORD,
+                    timeout=SSH_CONNECT_TIMEOUT, banner_timeout=SSH_CONNECT_TIMEOUT,
+                    auth_timeout=SSH_CONNECT_TIMEOUT)
+    except Exception:
         ssh.close()
+        raise
+    return ssh
+
+class SSHConnectionPool:
+    """Keeps idle SSH connections per host so commands skip the handshake and login."""
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.idle = {}  # host -> list of idle SSHClient
+
+    def acquire(self, host):
+        """Return an idle live connection to host, or open a new one."""
+        with self.lock:
+            idle = self.idle.get(host, [])
+            while idle:
+                ssh = idle.pop()
+                transport = ssh.get_transport()
+                if transport is not None and transport.is_active():
+                    return ssh
+                ssh.close()
+        return open_ssh_connection(host)
+
+    def release(self, host, ssh):
+        """Return a healthy connection to the pool, closing it if the pool is full."""
+        with self.lock:
+            idle = self.idle.setdefault(host, [])
+            if len(idle) < self.size:
+                idle.append(ssh)
+                return
+        ssh.close()
+
+    def close_all(self):
+        """Close every idle connection."""
+        with self.lock:
+            connections = [ssh for idle in self.idle.values() for ssh in idle]
+            self.idle.clear()
+        for ssh in connections:
+            ssh.close()
+
+ssh_pool = SSHConnectionPool(SSH_POOL_SIZE)
+
+def ssh_execute_command(command, host=VM_HOST):
+    """Execute a command on a Linux VM via SSH."""
+    try:
+        ssh = ssh_pool.acquire(host)
+        try:
+            # The channel timeout makes a hung command raise instead of blocking the read forever
+            stdin, stdout, stderr = ssh.exec_command(command, timeout=SSH_COMMAND_TIMEOUT)
+            output = stdout.read().decode().strip()
+            error = stderr.read().decode().strip()
+        except Exception:
+            # A connection that failed mid-command is not trusted for reuse
+            ssh.close()
+            raise
+        ssh_pool.release(host, ssh)
         if error:
             return f"SSH error: {error}"
         return output
+    except socket.timeout:
+        return f"SSH error: command timed out after {SSH_COMMAND_TIMEOUT}s without output"
     except Exception as e:
         return f"SSH connection failed: {e}"
 
+def ssh_stream_command(command, on_chunk, host=VM_HOST):
+    """Execute a command via SSH, passing stdout to on_chunk in bounded chunks as it arrives.
+
+    Returns a (exit_status, stderr_tail) tuple once the command has exited.
+    """
+    ssh = open_ssh_connection(host)
+    try:
+        channel = ssh.get_transport().open_session()
+        channel.settimeout(STREAM_FLUSH_INTERVAL)
+        channel.exec_command(command)
+
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        buffer = bytearray()
+        stderr_tail = bytearray()
+        buffered_since = None
+        while True:
+            try:
+                data = channel.recv(STREAM_CHUNK_SIZE - len(buffer))
+            except socket.timeout:
+                data = None
+            # Drain stderr as well so the remote side never blocks on a full window
+            while channel.recv_stderr_ready():
+                stderr_tail += channel.recv_stderr(STREAM_STDERR_LIMIT)
+                del stderr_tail[:-STREAM_STDERR_LIMIT]
+
+            if data:
+                if buffered_since is None:
+                    buffered_since = time.monotonic()
+                buffer += data
+            eof = data == b""
+            if buffer and (eof or len(buffer) >= STREAM_CHUNK_SIZE
+                           or time.monotonic() - buffered_since >= STREAM_FLUSH_INTERVAL):
+                on_chunk(decoder.decode(bytes(buffer), final=eof))
+                buffer.clear()
+                buffered_since = None
+            if eof:
+                break
+
+        exit_status = channel.recv_exit_status()
+        while channel.recv_stderr_ready():
+            stderr_tail += channel.recv_stderr(STREAM_STDERR_LIMIT)
+            del stderr_tail[:-STREAM_STDERR_LIMIT]
+        return exit_status, stderr_tail.decode(errors="replace").strip()
+    finally:
+        ssh.close()
+
+def read_meminfo():
+    """Read /proc/meminfo into a dict of values in kB."""
+    meminfo = {}
+    with open("/proc/meminfo") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            meminfo[key] = int(value.split()[0])
+    return meminfo
+
+def read_net_dev():
+    """Read per-interface byte and packet counters from /proc/net/dev."""
+    interfaces = {}
+    with open("/proc/net/dev") as f:
+        for line in f.readlines()[2:]:
+            name, _, counters = line.partition(":")
+            fields = counters.split()
+            interfaces[name.strip()] = {
+                "rx_bytes": int(fields[0]),
+                "rx_packets": int(fields[1]),
+                "tx_bytes": int(fields[8]),
+                "tx_packets": int(fields[9]),
+            }
+    return interfaces
+
+def read_ipv4_addresses():
+    """Return a dict of interface name to IPv4 address for the configured interfaces."""
+    addresses = {}
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for _, name in socket.if_nameindex():
+            try:
+                request = struct.pack("256s", name.encode()[:15])
+                addresses[name] = socket.inet_ntoa(fcntl.ioctl(sock.fileno(), SIOCGIFADDR, request)[20:24])
+            except OSError:
+                continue  # Interface has no IPv4 address
+    return addresses
+
+def is_local_host(host):
+    """Check whether a target host is the machine the agent runs on."""
+    if PROBE_BACKEND == "local":
+        return True
+    if PROBE_BACKEND != "auto":
+        return False
+    if host in LOCAL_HOST_NAMES or host == socket.gethostname():
+        return True
+    try:
+        return host in read_ipv4_addresses().values()
+    except OSError:
+        return False
+
+def execute_local_command(command):
+    """Run one of the numbered agent commands against this machine without SSH."""
+    if command == "1":
+        return "Current directory files:\n" + "\n".join(sorted(
+            name for name in os.listdir(LOCAL_WORKDIR) if not name.startswith(".")))
+    elif command == "2":
+        return "IP addresses:\n" + "\n".join(read_ipv4_addresses().values())
+    elif command == "3":
+        available_mb = read_meminfo()["MemAvailable"] // 1024
+        return f"Available RAM: {available_mb} MB"
+    elif command == "4":
+        filename = f"new_file_{int(time.time())}.txt"
+        with open(os.path.join(LOCAL_WORKDIR, filename), "w") as f:
+            f.write("Created by MQTT agent\n")
+        return f"Created file: {filename}"
+    return "Invalid command. Use: 1 (list files), 2 (IP addresses), 3 (available RAM), 4 (create file)"
+
+def collect_telemetry():
+    """Collect structured local metrics for a telemetry push."""
+    start = time.perf_counter()
+    meminfo = read_meminfo()
+    with open("/proc/loadavg") as f:
+        load = [float(value) for value in f.read().split()[:3]]
+    addresses = read_ipv4_addresses()
+    interfaces = read_net_dev()
+    for name, counters in interfaces.items():
+        counters["ipv4"] = addresses.get(name)
+    return {
+        "host": socket.gethostname(),
+        "timestamp": time.time(),
+        "memory_mb": {
+            "total": meminfo["MemTotal"] // 1024,
+            "free": meminfo["MemFree"] // 1024,
+            "available": meminfo["MemAvailable"] // 1024,
+        },
+        "load": load,
+        "interfaces": interfaces,
+        "probe_us": round((time.perf_counter() - start) * 1e6, 1),
+    }
+
+def telemetry_loop(client):
+    """Publish local metrics every TELEMETRY_INTERVAL seconds until telemetry_stop is set."""
+    next_run = time.monotonic()
+    while not telemetry_stop.is_set():
+        try:
+            client.publish(MQTT_TELEMETRY_TOPIC, json.dumps(collect_telemetry()), qos=0)
+        except Exception as e:
+            logger.error(f"Error publishing telemetry: {e}")
+        # Schedule against a fixed grid so publishing time does not drift the interval
+        next_run += TELEMETRY_INTERVAL
+        telemetry_stop.wait(max(0, next_run - time.monotonic()))
+
 def setup_mqtt_client():
     """Set up and connect MQTT client."""
     try:
-        client = mqtt.Client(client_id=MQTT_CLIENT_ID, clean_session=True)
+        client = create_client(MQTT_CLIENT_ID, clean_session=True)
         client.on_connect = on_connect
         client.on_message = on_message
         client.on_publish = on_publish
-        client.connect(MQTT_BROKER, MQTT_PORT, 60)
+        client.connect(*broker_address(MQTT_BROKER, MQTT_PORT), 60)
         client.loop_start()
+        log_metrics_periodically(client, MQTT_METRICS_INTERVAL, logger.info)
         return client
     except Exception as e:
         logger.error(f"Failed to connect to MQTT broker: {e}")
         return None
 
-def on_connect(client, userdata, flags, rc):
+def on_connect(client, userdata, flags, rc, properties):
     """Callback for when the client connects to the broker."""
     if rc == 0:
         logger.info("Connected to MQTT broker")
@@ -59,64 +333,297 @@ def on_connect(client, userdata, flags, rc):
     else:
         logger.error(f"Failed to connect to MQTT broker with code: {rc}")
 
-def on_publish(client, userdata, mid):
+def on_publish(client, userdata, mid, reason_code, properties):
     """Callback for when a message is published."""
     logger.info(f"Message {mid} published to {MQTT_RESULT_TOPIC}")
 
+def is_ssh_failure(output):
+    """Check whether an ssh_execute_command result is an error message."""
+    return "SSH error" in output or "SSH connection failed" in output
+
+def is_failed_result(result):
+    """Check whether an agent command result reports a failure."""
+    return is_ssh_failure(result) or result.startswith("Error") or result.startswith("Invalid")
+
+class CommandResultCache:
+    """Per-host, per-command result cache with TTLs and single-flight coalescing."""
+
+    def __init__(self, ttls):
+        self.ttls = ttls
+        self.lock = threading.Lock()
+        self.entries = {}  # (host, command) -> (expires_at, result)
+        self.in_flight = {}  # (host, command) -> Future shared by concurrent callers
+        self.generations = {}  # host -> invalidation counter
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0}
+
+    def get_or_run(self, host, command, run):
+        """Return a fresh cached result, join an identical running request, or run it."""
+        ttl = self.ttls.get(command, 0)
+        if ttl <= 0:
+            return run()
+
+        key = (host, command)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.stats["hits"] += 1
+                return entry[1]
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                self.stats["misses"] += 1
+                future = Future()
+                self.in_flight[key] = future
+                generation = self.generations.get(host, 0)
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = run()
+        except Exception as e:
+            with self.lock:
+                del self.in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self.lock:
+            del self.in_flight[key]
+            # Errors are never cached, and neither is a result that raced an invalidation
+            if not is_failed_result(result) and self.generations.get(host, 0) == generation:
+                self.entries[key] = (time.monotonic() + ttl, result)
+        future.set_result(result)
+        return result
+
+    def invalidate(self, host, commands):
+        """Drop cached results of the given commands for a host."""
+        with self.lock:
+            self.generations[host] = self.generations.get(host, 0) + 1
+            for command in commands:
+                if self.entries.pop((host, command), None) is not None:
+                    self.stats["invalidations"] += 1
+
+    def get_stats(self):
+        """Return a snapshot of the hit/miss counters."""
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.entries)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["coalesced"]) / lookups, 3) if lookups else 0.0
+        return stats
+
+result_cache = CommandResultCache(COMMAND_CACHE_TTL)
+
+def run_agent_command(command, host=VM_HOST):
+    """Run an agent command on a host, serving read-only commands from the result cache."""
+    if command == "stats":
+        return json.dumps(result_cache.get_stats())
+    result = result_cache.get_or_run(host, command, lambda: execute_agent_command(command, host))
+    if command in COMMAND_INVALIDATES:
+        result_cache.invalidate(host, COMMAND_INVALIDATES[command])
+    return result
+
+def execute_agent_command(command, host=VM_HOST):
+    """Run one of the numbered agent commands on a host and return the result text."""
+    if is_local_host(host):
+        try:
+            return execute_local_command(command)
+        except Exception as e:
+            return f"Error running local probe: {e}"
+
+    if command == "1":
+        # List current directory files on VM
+        try:
+            ls_output = ssh_execute_command("ls", host)
+            if is_ssh_failure(ls_output):
+                result = ls_output
+            else:
+                files = ls_output.splitlines()
+                result = "Current directory files:\n" + "\n".join(files)
+        except Exception as e:
+            result = f"Error listing files: {e}"
+    elif command == "2":
+        # Get IP addresses from VM
+        try:
+            ip_output = ssh_execute_command("ip addr show", host)
+            if is_ssh_failure(ip_output):
+                result = ip_output
+            else:
+                ip_lines = [line for line in ip_output.splitlines() if "inet " in line]
+                ip_addresses = [line.split()[1].split('/')[0] for line in ip_lines]
+                result = "IP addresses:\n" + "\n".join(ip_addresses)
+        except Exception as e:
+            result = f"Error getting IP addresses: {e}"
+    elif command == "3":
+        # Get available RAM from VM
+        try:
+            mem_output = ssh_execute_command("free -m | grep Mem", host)
+            if is_ssh_failure(mem_output):
+                result = mem_output
+            else:
+                available_mb = mem_output.split()[3]  # Available memory in MB
+                result = f"Available RAM: {available_mb} MB"
+        except Exception as e:
+            result = f"Error getting memory: {e}"
+    elif command == "4":
+        # Create a new file on VM
+        try:
+            filename = f"new_file_{int(time.time())}.txt"
+            ssh_command = f"echo 'Created by MQTT agent' > {filename}"
+            ssh_result = ssh_execute_command(ssh_command, host)
+            if is_ssh_failure(ssh_result):
+                result = ssh_result
+            else:
+                result = f"Created file: {filename}"
+        except Exception as e:
+            result = f"Error creating file: {e}"
+    else:
+        result = "Invalid command. Use: 1 (list files), 2 (IP addresses), 3 (available RAM), 4 (create file), stats (cache statistics), stream <1-3> (chunked raw output)"
+    return result
+
+def run_host_command(command, host):
+    """Run a command on one fleet host and return its per-host result record."""
+    start = time.monotonic()
+    result = run_agent_command(command, host)
+    return {
+        "host": host,
+        "command": command,
+        "ok": not is_failed_result(result),
+        "result": result,
+        "elapsed_ms": round((time.monotonic() - start) * 1000, 1),
+    }
+
+def fan_out_command(client, group, command):
+    """Run a command on every host of a group, publishing results as they complete."""
+    hosts = HOST_GROUPS[group]
+    start = time.monotonic()
+    logger.info(f"Fanning out command {command} to {len(hosts)} hosts in group '{group}'")
+
+    # Each host is its own task, so a slow or unreachable host only holds its own worker
+    futures = {fanout_executor.submit(run_host_command, command, host): host for host in hosts}
+    succeeded = []
+    failed = []
+
+    def publish_record(host, record):
+        record["group"] = group
+        (succeeded if record["ok"] else failed).append(host)
+        client.publish(f"{MQTT_FLEET_RESULT_TOPIC}/{group}/{host}", json.dumps(record), qos=1)
+        logger.info(f"Published result for {host} ({'ok' if record['ok'] else 'failed'})")
+
+    try:
+        for future in as_completed(futures, timeout=FANOUT_TIMEOUT):
+            host = futures.pop(future)
+            try:
+                record = future.result()
+            except Exception as e:
+                record = {"host": host, "command": command, "ok": False,
+                          "result": f"Error processing command: {e}", "elapsed_ms": None}
+            publish_record(host, record)
+    except TimeoutError:
+        # Hosts still running are reported now; their workers free up once SSH_COMMAND_TIMEOUT fires
+        for future, host in futures.items():
+            future.cancel()
+            publish_record(host, {"host": host, "command": command, "ok": False,
+                                  "result": f"Error: no result within {FANOUT_TIMEOUT}s",
+                                  "elapsed_ms": round((time.monotonic() - start) * 1000, 1)})
+
+    summary = {
+        "group": group,
+        "command": command,
+        "hosts": len(hosts),
+        "succeeded": len(succeeded),
+        "failed": len(failed),
+        "failed_hosts": failed,
+        "elapsed_ms": round((time.monotonic() - start) * 1000, 1),
+    }
+    client.publish(f"{MQTT_FLEET_RESULT_TOPIC}/{group}/summary", json.dumps(summary), qos=1)
+    logger.info(f"Published fleet summary for group '{group}': {summary['succeeded']}/{summary['hosts']} succeeded")
+
+class StreamPublishError(Exception):
+    """A chunk of streamed output was refused by the client or never acknowledged by the broker."""
+
+def wait_for_ack(info):
+    try:
+        info.wait_for_publish(STREAM_ACK_TIMEOUT)
+    except (RuntimeError, ValueError) as e:
+        raise StreamPublishError(str(e)) from e
+    if not info.is_published():
+        raise StreamPublishError(f"no acknowledgement within {STREAM_ACK_TIMEOUT}s")
+
+def stream_command(client, command, host=VM_HOST):
+    """Stream the output of a read-only command to MQTT with sequence numbers and an end marker.
+
+    At most STREAM_MAX_INFLIGHT chunks are left unacknowledged; beyond that the SSH
+    channel is not read until the broker catches up, so a slow broker slows the
+    command down instead of chunks being dropped.
+    """
+    stream_id = uuid.uuid4().hex[:12]
+    topic = f"{MQTT_STREAM_TOPIC}/{stream_id}"
+    start = time.monotonic()
+    state = {"seq": 0, "bytes": 0, "first_chunk_ms": None}
+    in_flight = deque()
+    logger.info(f"Streaming command {command} to {topic}")
+
+    def publish_chunk(text):
+        if state["first_chunk_ms"] is None:
+            state["first_chunk_ms"] = round((time.monotonic() - start) * 1000, 1)
+        info = client.publish(topic, json.dumps({"stream_id": stream_id, "seq": state["seq"], "data": text}), qos=1)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            raise StreamPublishError(f"chunk {state['seq']} not published: {mqtt.error_string(info.rc)}")
+        in_flight.append(info)
+        state["seq"] += 1
+        state["bytes"] += len(text)
+        if len(in_flight) >= STREAM_MAX_INFLIGHT:
+            wait_for_ack(in_flight.popleft())
+
+    end = {"stream_id": stream_id, "command": command, "host": host}
+    try:
+        exit_status, error = ssh_stream_command(STREAM_SHELL_COMMANDS[command], publish_chunk, host)
+        # The end marker only follows once every chunk has reached the broker
+        while in_flight:
+            wait_for_ack(in_flight.popleft())
+        end.update({"exit_status": exit_status, "error": error or None})
+    except StreamPublishError as e:
+        logger.error(f"Stream {stream_id} stopped: {e}")
+        end.update({"exit_status": None, "error": f"Publishing output failed: {e}"})
+    except Exception as e:
+        end.update({"exit_status": None, "error": f"SSH connection failed: {e}"})
+    end.update({
+        "seq": state["seq"],
+        "eof": True,
+        "bytes": state["bytes"],
+        "first_chunk_ms": state["first_chunk_ms"],
+        "elapsed_ms": round((time.monotonic() - start) * 1000, 1),
+    })
+    client.publish(topic, json.dumps(end), qos=1)
+    logger.info(f"Finished stream {stream_id}: {state['seq']} chunks, {state['bytes']} characters")
+
 def on_message(client, userdata, msg):
     """Callback for when a message is received."""
     try:
         command = msg.payload.decode().strip()
         logger.info(f"Received command: {command}")
-        
-        if command == "1":
-            # List current directory files on VM
-            try:
-                ls_output = ssh_execute_command("ls")
-                if "SSH error" in ls_output or "SSH connection failed" in ls_output:
-                    result = ls_output
-                else:
-                    files = ls_output.splitlines()
-                    result = "Current directory files:\n" + "\n".join(files)
-            except Exception as e:
-                result = f"Error listing files: {e}"
-        elif command == "2":
-            # Get IP addresses from VM
-            try:
-                ip_output = ssh_execute_command("ip addr show")
-                if "SSH error" in ip_output or "SSH connection failed" in ip_output:
-                    result = ip_output
-                else:
-                    ip_lines = [line for line in ip_output.splitlines() if "inet " in line]
-                    ip_addresses = [line.split()[1].split('/')[0] for line in ip_lines]
-                    result = "IP addresses:\n" + "\n".join(ip_addresses)
-            except Exception as e:
-                result = f"Error getting IP addresses: {e}"
-        elif command == "3":
-            # Get available RAM from VM
-            try:
-                mem_output = ssh_execute_command("free -m | grep Mem")
-                if "SSH error" in mem_output or "SSH connection failed" in mem_output:
-                    result = mem_output
-                else:
-                    available_mb = mem_output.split()[3]  # Available memory in MB
-                    result = f"Available RAM: {available_mb} MB"
-            except Exception as e:
-                result = f"Error getting memory: {e}"
-        elif command == "4":
-            # Create a new file on VM
-            try:
-                filename = f"new_file_{int(time.time())}.txt"
-                ssh_command = f"echo 'Created by MQTT agent' > {filename}"
-                ssh_result = ssh_execute_command(ssh_command)
-                if "SSH error" in ssh_result or "SSH connection failed" in ssh_result:
-                    result = ssh_result
-                else:
-                    result = f"Created file: {filename}"
-            except Exception as e:
-                result = f"Error creating file: {e}"
+
+        group, sep, group_command = command.partition(":")
+        if command.startswith("stream "):
+            stream_target = command[len("stream "):].strip()
+            if stream_target not in STREAM_SHELL_COMMANDS:
+                result = f"Cannot stream command {stream_target}. Streamable: {', '.join(STREAM_SHELL_COMMANDS)}"
+            else:
+                threading.Thread(target=stream_command, args=(client, stream_target), daemon=True).start()
+                return
+        elif sep:
+            if group not in HOST_GROUPS:
+                result = f"Unknown host group: {group}. Known groups: {', '.join(HOST_GROUPS)}"
+            else:
+                # Run the fan-out off the network thread so the MQTT loop stays responsive
+                threading.Thread(target=fan_out_command, args=(client, group, group_command.strip()),
+                                 daemon=True).start()
+                return
         else:
-            result = "Invalid command. Use: 1 (list files), 2 (IP addresses), 3 (available RAM), 4 (create file)"
+            result = run_agent_command(command, VM_HOST)
         
         # Publish the result
         client.publish(MQTT_RESULT_TOPIC, result, qos=1)
@@ -133,6 +640,10 @@ def main():
     if not mqtt_client:
         logger.error("Exiting due to MQTT setup failure")
         return
+
+    if TELEMETRY_INTERVAL > 0:
+        threading.Thread(target=telemetry_loop, args=(mqtt_client,), daemon=True).start()
+        logger.info(f"Publishing telemetry to {MQTT_TELEMETRY_TOPIC} every {TELEMETRY_INTERVAL}s")
     
     try:
         while True:
@@ -140,6 +651,9 @@ def main():
     except KeyboardInterrupt:
         logger.info("Shutting down")
     finally:
+        telemetry_stop.set()
+        fanout_executor.shutdown(wait=False, cancel_futures=True)
+        ssh_pool.close_all()
         mqtt_client.loop_stop()
         mqtt_client.disconnect()
         logger.info("Script execution completed")
@@ -0,0 +1,270 @@
+import argparse
+import asyncio
+import json
+import random
+import resource
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from mqtt_common import broker_address, create_client
+from sensor_payload import DATE_FORMAT, encode_binary
+
+# Broker Configuration
+BROKER_ADDRESS = "broker.hivemq.com"
+BROKER_PORT = 1883
+KEEPALIVE = 60
+
+# Device Configuration
+CLIENT_ID_PREFIX = "SimDevice"
+SENSORS = ["Temperature", "Humidity", "Pressure"]
+SENSOR_RANGES = {"Temperature": (15, 30), "Humidity": (30, 70), "Pressure": (980, 1040)}
+TOPIC_PATTERN = "Home/BedRoom/{sensor}"
+PUBLISH_INTERVAL = 5.0  # Seconds between readings of one device
+PUBLISH_JITTER = 0.1  # Each device's interval is PUBLISH_INTERVAL +/- this fraction
+
+# Reconnect Configuration
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+CONNECT_TIMEOUT = 10.0
+CONNECT_WORKERS = 32  # Threads running the blocking TCP connects
+
+REPORT_INTERVAL = 5.0
+
+def read_rss_bytes():
+    """Current resident set size of this process, or the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def raise_file_limit():
+    """Raise the open file limit to its hard maximum; every device holds one socket."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+class SimulatedDevice:
+    """One sensor with its own paho client, publish schedule and reconnect backoff.
+
+    This is the asyncio counterpart of connect_broker in 3MQTT.py: instead of a
+    loop_start() thread per client, the client's socket is registered with the
+    simulator's event loop, so thousands of devices share a single thread.
+    """
+
+    def __init__(self, simulator, index):
+        self.simulator = simulator
+        self.client_id = f"{CLIENT_ID_PREFIX}-{index}"
+        self.sensor = SENSORS[index % len(SENSORS)]
+        self.topic = TOPIC_PATTERN.format(sensor=self.sensor, device=index)
+        self.interval = simulator.interval * random.uniform(1 - PUBLISH_JITTER, 1 + PUBLISH_JITTER)
+        self.connected = asyncio.Event()
+        self.batch = []
+        # Thousands of sockets share the box, so they keep the kernel's default buffer sizes
+        self.client = create_client(self.client_id, socket_buffer_size=None)
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_socket_open = self.on_socket_open
+        self.client.on_socket_close = self.on_socket_close
+        self.client.on_socket_register_write = self.on_socket_register_write
+        self.client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    # The socket callbacks may run on a connect worker thread, so event loop
+    # registration is handed over with call_soon_threadsafe. The descriptor is
+    # captured now because the socket can already be closed when the loop gets to it.
+    def call_in_loop(self, method, sock, *args):
+        self.simulator.loop.call_soon_threadsafe(self.apply_registration, method, sock.fileno(), *args)
+
+    @staticmethod
+    def apply_registration(method, fd, *args):
+        try:
+            method(fd, *args)
+        except (OSError, ValueError):
+            pass  # The socket was closed before its registration ran
+
+    def on_socket_open(self, client, userdata, sock):
+        self.call_in_loop(self.simulator.loop.add_reader, sock, client.loop_read)
+
+    def on_socket_close(self, client, userdata, sock):
+        self.call_in_loop(self.simulator.loop.remove_reader, sock)
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self.call_in_loop(self.simulator.loop.add_writer, sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self.call_in_loop(self.simulator.loop.remove_writer, sock)
+
+    def on_connect(self, client, userdata, flags, reason_code, properties):
+        if not reason_code.is_failure:
+            self.connected.set()
+
+    def on_disconnect(self, client, userdata, flags, reason_code, properties):
+        if self.connected.is_set() and not self.simulator.stopping.is_set():
+            self.simulator.stats["disconnects"] += 1
+        self.connected.clear()
+
+    def sample(self):
+        """Take one reading as (sensor_id, field, epoch_seconds, value)."""
+        low, high = SENSOR_RANGES[self.sensor]
+        return self.client_id, self.sensor, time.time(), f"{random.uniform(low, high):.2f}"
+
+    def next_payload(self):
+        """Return the payload to publish this tick, or None while a binary batch is filling."""
+        sensor_id, field, timestamp, value = self.sample()
+        if self.simulator.payload_format == "json":
+            return json.dumps({
+                "Sensor_ID": sensor_id,
+                "Date": datetime.fromtimestamp(timestamp).strftime(DATE_FORMAT),
+                field: value,
+            })
+        self.batch.append((sensor_id, field, timestamp, value))
+        if len(self.batch) < self.simulator.batch_size:
+            return None
+        payload, self.batch = encode_binary(self.batch), []
+        return payload
+
+    async def connect(self):
+        """Connect with exponential backoff until the broker accepts the session."""
+        delay = RECONNECT_MIN_DELAY
+        while not self.simulator.stopping.is_set():
+            self.simulator.stats["connect_attempts"] += 1
+            try:
+                await self.simulator.loop.run_in_executor(
+                    self.simulator.connect_executor, self.client.connect,
+                    self.simulator.broker, self.simulator.port, KEEPALIVE)
+                await asyncio.wait_for(self.connected.wait(), CONNECT_TIMEOUT)
+                return
+            except (OSError, asyncio.TimeoutError):
+                self.simulator.stats["connect_failures"] += 1
+                self.client.disconnect()
+            # Full jitter keeps a fleet that lost the broker together from reconnecting in lockstep
+            await asyncio.sleep(random.uniform(0, delay))
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def run(self):
+        # Spread the first readings over one interval instead of a thundering herd
+        await asyncio.sleep(random.uniform(0, self.interval))
+        next_publish = time.monotonic()
+        while not self.simulator.stopping.is_set():
+            if not self.connected.is_set():
+                await self.connect()
+                continue
+            payload = self.next_payload()
+            if payload is not None:
+                self.client.publish(self.topic, payload, qos=self.simulator.qos)
+                self.simulator.stats["published"] += 1
+            if self.simulator.churn and random.random() < self.simulator.churn:
+                # Simulate a dropped link; the next iteration reconnects
+                self.client.disconnect()
+                self.connected.clear()
+                self.simulator.stats["dropped"] += 1
+            next_publish += self.interval
+            await asyncio.sleep(max(0.0, next_publish - time.monotonic()))
+
+    def close(self):
+        self.client.disconnect()
+
+class DeviceSimulator:
+    """Runs many SimulatedDevices on one event loop and reports the per-device cost."""
+
+    def __init__(self, count, broker=BROKER_ADDRESS, port=BROKER_PORT, interval=PUBLISH_INTERVAL, qos=0, churn=0.0,
+                 payload_format="json", batch_size=1):
+        self.count = count
+        self.payload_format = payload_format
+        self.batch_size = batch_size
+        self.broker, self.port = broker_address(broker, port)
+        self.interval = interval
+        self.qos = qos
+        self.churn = churn
+        self.devices = []
+        self.stats = {"published": 0, "connect_attempts": 0, "connect_failures": 0, "disconnects": 0, "dropped": 0}
+        self.loop = None
+        self.stopping = None
+        self.connect_executor = ThreadPoolExecutor(max_workers=CONNECT_WORKERS)
+
+    async def misc_loop(self):
+        """Drive paho's keepalive and retry timers for every client once a second."""
+        while not self.stopping.is_set():
+            for device in self.devices:
+                device.client.loop_misc()
+            await asyncio.sleep(1)
+
+    async def report_loop(self, baseline_rss):
+        """Print throughput, connection state and memory/CPU per simulated device."""
+        last_time, last_cpu, last_published = time.monotonic(), time.process_time(), 0
+        while not self.stopping.is_set():
+            await asyncio.sleep(REPORT_INTERVAL)
+            now, cpu = time.monotonic(), time.process_time()
+            published = self.stats["published"]
+            connected = sum(1 for device in self.devices if device.connected.is_set())
+            rss = read_rss_bytes()
+            cpu_share = (cpu - last_cpu) / (now - last_time)
+            messages = published - last_published
+            print(f"devices {connected}/{self.count} connected  {messages / (now - last_time):8.1f} msg/s  "
+                  f"RSS {rss / 2**20:7.1f} MiB ({(rss - baseline_rss) / self.count / 1024:5.1f} KiB/device)  "
+                  f"CPU {cpu_share * 100:5.1f}% ({cpu_share * 1e6 / self.count:6.2f} us/s per device, "
+                  f"{(cpu - last_cpu) * 1e6 / max(messages, 1):6.1f} us/msg)  "
+                  f"connect attempts {self.stats['connect_attempts']}  failures {self.stats['connect_failures']}")
+            last_time, last_cpu, last_published = now, cpu, published
+
+    async def run(self, duration=None):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        baseline_rss = read_rss_bytes()
+        self.devices = [SimulatedDevice(self, i) for i in range(self.count)]
+        tasks = [asyncio.create_task(device.run()) for device in self.devices]
+        tasks.append(asyncio.create_task(self.misc_loop()))
+        tasks.append(asyncio.create_task(self.report_loop(baseline_rss)))
+        start_cpu, start = time.process_time(), time.monotonic()
+        try:
+            if duration:
+                await asyncio.sleep(duration)
+            else:
+                await asyncio.Event().wait()
+        finally:
+            self.stopping.set()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for device in self.devices:
+                device.close()
+            # Let the DISCONNECT packets go out before the loop stops
+            await asyncio.sleep(0.5)
+            self.connect_executor.shutdown(wait=False)
+            elapsed = time.monotonic() - start
+            print(f"Simulated {self.count} devices for {elapsed:.1f}s: {self.stats['published']} messages "
+                  f"({self.stats['published'] / elapsed:.1f} msg/s), {self.stats['dropped']} simulated drops, "
+                  f"{self.stats['disconnects']} disconnects, CPU {time.process_time() - start_cpu:.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a fleet of MQTT sensor devices in one process")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--broker", default=BROKER_ADDRESS)
+    parser.add_argument("--port", type=int, default=BROKER_PORT)
+    parser.add_argument("--interval", type=float, default=PUBLISH_INTERVAL, help="Seconds between readings per device")
+    parser.add_argument("--qos", type=int, choices=[0, 1, 2], default=0)
+    parser.add_argument("--churn", type=float, default=0.0, help="Probability that a device drops its link after a publish")
+    parser.add_argument("--format", choices=["json", "binary"], default="json", help="Sensor payload encoding")
+    parser.add_argument("--batch", type=int, default=1, help="Readings per binary message")
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds (default: run until Ctrl+C)")
+    args = parser.parse_args()
+
+    if args.batch > 1 and args.format != "binary":
+        parser.error("--batch needs --format binary; JSON payloads carry one reading")
+    limit = raise_file_limit()
+    if args.devices + 64 > limit:
+        parser.error(f"{args.devices} devices need more sockets than the open file limit of {limit}")
+    simulator = DeviceSimulator(args.devices, args.broker, args.port, args.interval, args.qos, args.churn,
+                                args.format, args.batch)
+    try:
+        asyncio.run(simulator.run(args.duration))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import time
+from collections import deque
+
+# Duplicate Filter Configuration
+DEDUP_WINDOW = 600  # Seconds a reading key is remembered; QoS 1 redeliveries arrive well within this
+DEDUP_MAX_KEYS = 100000  # Oldest keys are forgotten beyond this, bounding memory
+
+class DuplicateFilter:
+    """Time-windowed, size-bounded set of reading keys seen recently.
+
+    QoS 1 lets the broker deliver a reading more than once, typically right after a
+    reconnect. seen() answers from memory in O(1); keys that have aged out of the
+    window, or were never added because their write failed, are caught by the
+    database's unique index instead.
+    """
+
+    def __init__(self, window=DEDUP_WINDOW, max_keys=DEDUP_MAX_KEYS):
+        self.window = window
+        self.max_keys = max_keys
+        self.keys = set()
+        self.order = deque()  # (arrival time, key), oldest first
+        self.stats = {"readings": 0, "duplicates": 0, "db_duplicates": 0}
+
+    def expire(self, now):
+        order, keys = self.order, self.keys
+        while order and (now - order[0][0] > self.window or len(order) >= self.max_keys):
+            keys.discard(order.popleft()[1])
+
+    def seen(self, *key):
+        """Return True if key was stored within the window, counting it as a duplicate."""
+        self.expire(time.monotonic())
+        self.stats["readings"] += 1
+        if key in self.keys:
+            self.stats["duplicates"] += 1
+            return True
+        return False
+
+    def add(self, *key):
+        """Remember key once its reading has been written, so only stored readings suppress others."""
+        now = time.monotonic()
+        self.expire(now)
+        if key not in self.keys:
+            self.keys.add(key)
+            self.order.append((now, key))
+
+    def record_db_duplicate(self):
+        """Count a duplicate that got past the filter and was rejected by the unique index."""
+        self.stats["db_duplicates"] += 1
+
+    def rate(self):
+        """Fraction of readings dropped as duplicates, in memory or by the database."""
+        dropped = self.stats["duplicates"] + self.stats["db_duplicates"]
+        return dropped / self.stats["readings"] if self.stats["readings"] else 0.0
@@ -0,0 +1,206 @@
+import argparse
+import math
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from flask import Flask, Response, request, stream_with_context
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Export Configuration
+DB_Name = "IoT.db"
+SENSOR_TABLES = {"Temperature": "Temperature_Data", "Humidity": "Humidity_Data", "Pressure": "Pressure_Data"}
+EXPORT_CHUNK_ROWS = 50000  # Rows fetched, converted and written per step
+EXPORT_COLUMNS = ["Sensor", "id", "SensorID", "Date_n_Time", "Value", "Timestamp"]
+# Columnar output needs pyarrow; CSV and newline-delimited JSON always work
+EXPORT_FORMATS = ["csv", "ndjson"] + (["parquet"] if pa is not None else [])
+MIME_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+EXPORT_PORT = 5001
+SPOOL_MAX_BYTES = 8 * 1024 * 1024  # Parquet responses larger than this are spooled to disk
+
+def parse_time(value):
+    """Accept epoch seconds or an ISO 8601 date/time; None means unbounded."""
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def parse_sensors(value):
+    sensors = [s.strip() for s in value.split(",") if s.strip()] if value else list(SENSOR_TABLES)
+    unknown = [s for s in sensors if s not in SENSOR_TABLES]
+    if unknown:
+        raise ValueError(f"Unknown sensors: {', '.join(unknown)}. Known: {', '.join(SENSOR_TABLES)}")
+    return sensors
+
+def iter_row_chunks(conn, sensors, start=None, end=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield lists of EXPORT_COLUMNS rows in time order per sensor, chunk_rows at a time.
+
+    The range [start, end) is read through the Timestamp index and values are cast
+    to numbers by SQLite, so only one chunk of rows is ever held in memory.
+    """
+    low = -math.inf if start is None else start
+    high = math.inf if end is None else end
+    for sensor in sensors:
+        cursor = conn.execute(f"select ?, id, SensorID, Date_n_Time, cast({sensor} as real), Timestamp "
+                              f"from {SENSOR_TABLES[sensor]} where Timestamp >= ? and Timestamp < ? "
+                              f"order by Timestamp", (sensor, low, high))
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield rows
+
+def csv_quoted(column):
+    """SQL expression rendering a text column as a quoted CSV field."""
+    return f"""'"' || replace(ifnull({column}, ''), '"', '""') || '"'"""
+
+# SQLite renders each exported line itself, so the text formats cost one Python
+# string per row instead of a tuple of values that Python then has to format
+TEXT_LINE_SQL = {
+    "csv": f"? || ',' || id || ',' || {csv_quoted('SensorID')} || ',' || {csv_quoted('Date_n_Time')} "
+           "|| ',' || ifnull(cast({sensor} as real), '') || ',' || printf('%.6f', Timestamp)",
+    "ndjson": "json_object('Sensor', ?, 'id', id, 'SensorID', SensorID, 'Date_n_Time', Date_n_Time, "
+              "'Value', cast({sensor} as real), 'Timestamp', json(printf('%.6f', Timestamp)))",
+}
+
+def iter_text_export(conn, sensors, start=None, end=None, fmt="csv", chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield a CSV or NDJSON export as one string per chunk of rows."""
+    if fmt not in TEXT_LINE_SQL:
+        raise ValueError(f"{fmt} is not a text export format")
+    if fmt == "csv":
+        yield ",".join(EXPORT_COLUMNS) + "\n"
+    low = -math.inf if start is None else start
+    high = math.inf if end is None else end
+    for sensor in sensors:
+        cursor = conn.execute(f"select {TEXT_LINE_SQL[fmt].format(sensor=sensor)} from {SENSOR_TABLES[sensor]} "
+                              f"where Timestamp >= ? and Timestamp < ? order by Timestamp", (sensor, low, high))
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield "\n".join([line for line, in rows]) + "\n"
+
+def write_parquet(conn, sensors, sink, start=None, end=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Write the export as Parquet, one row group per chunk of rows. Returns the row count."""
+    schema = pa.schema([("Sensor", pa.string()), ("id", pa.int64()), ("SensorID", pa.string()),
+                        ("Date_n_Time", pa.string()), ("Value", pa.float64()), ("Timestamp", pa.float64())])
+    count = 0
+    with pq.ParquetWriter(sink, schema) as writer:
+        for rows in iter_row_chunks(conn, sensors, start, end, chunk_rows):
+            columns = [pa.array(column, type=field.type) for column, field in zip(zip(*rows), schema)]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            count += len(rows)
+    return count
+
+def export(db_path, sensors, out_path, start=None, end=None, fmt="csv", chunk_rows=EXPORT_CHUNK_ROWS):
+    """Export to a file, or to stdout for "-". Returns the number of rows written."""
+    conn = sqlite3.connect(db_path)
+    try:
+        if fmt == "parquet":
+            return write_parquet(conn, sensors, out_path, start, end, chunk_rows)
+        count = 0
+        out = sys.stdout if out_path == "-" else open(out_path, "w", newline="")
+        try:
+            for text in iter_text_export(conn, sensors, start, end, fmt, chunk_rows):
+                out.write(text)
+                count += text.count("\n")
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        return count - 1 if fmt == "csv" else count
+    finally:
+        conn.close()
+
+def create_app(db_path=DB_Name):
+    """Flask app serving GET /export?sensors=...&start=...&end=...&format=csv|ndjson|parquet."""
+    app = Flask(__name__)
+
+    @app.route("/export")
+    def export_endpoint():
+        fmt = request.args.get("format", "csv")
+        try:
+            sensors = parse_sensors(request.args.get("sensors"))
+            start = parse_time(request.args.get("start"))
+            end = parse_time(request.args.get("end"))
+            chunk_rows = int(request.args.get("chunk", EXPORT_CHUNK_ROWS))
+        except ValueError as e:
+            return Response(f"{e}\n", status=400, mimetype="text/plain")
+        if fmt not in EXPORT_FORMATS:
+            return Response(f"Unsupported format {fmt}. Available: {', '.join(EXPORT_FORMATS)}\n",
+                            status=400, mimetype="text/plain")
+        headers = {"Content-Disposition": f"attachment; filename=iot_export.{fmt}"}
+
+        if fmt == "parquet":
+            # Parquet writes its footer last, so the file is built first and then streamed back
+            spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+            conn = sqlite3.connect(db_path)
+            try:
+                write_parquet(conn, sensors, spool, start, end, chunk_rows)
+            finally:
+                conn.close()
+            spool.seek(0)
+
+            def file_chunks():
+                with spool:
+                    while True:
+                        data = spool.read(1024 * 1024)
+                        if not data:
+                            return
+                        yield data
+
+            return Response(file_chunks(), mimetype=MIME_TYPES[fmt], headers=headers)
+
+        def text_chunks():
+            # The connection belongs to the thread that streams the response
+            conn = sqlite3.connect(db_path)
+            try:
+                yield from iter_text_export(conn, sensors, start, end, fmt, chunk_rows)
+            finally:
+                conn.close()
+
+        return Response(stream_with_context(text_chunks()), mimetype=MIME_TYPES[fmt], headers=headers)
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream sensor readings out of IoT.db")
+    parser.add_argument("--db", default=DB_Name)
+    parser.add_argument("--sensors", help=f"Comma-separated subset of {', '.join(SENSOR_TABLES)} (default: all)")
+    parser.add_argument("--start", help="Epoch seconds or ISO date/time, inclusive")
+    parser.add_argument("--end", help="Epoch seconds or ISO date/time, exclusive")
+    parser.add_argument("--format", choices=["csv", "ndjson", "parquet"], default="csv")
+    parser.add_argument("--chunk", type=int, default=EXPORT_CHUNK_ROWS, help="Rows per fetch/write step")
+    parser.add_argument("-o", "--output", default="-", help="Output file, - for stdout")
+    parser.add_argument("--serve", action="store_true", help="Serve GET /export over HTTP instead")
+    parser.add_argument("--port", type=int, default=EXPORT_PORT)
+    args = parser.parse_args()
+
+    if args.serve:
+        create_app(args.db).run(port=args.port, threaded=True)
+        return
+    if args.format not in EXPORT_FORMATS:
+        parser.error("parquet export needs pyarrow installed")
+    if args.format == "parquet" and args.output == "-":
+        parser.error("parquet export needs an output file")
+    try:
+        sensors = parse_sensors(args.sensors)
+        start, end = parse_time(args.start), parse_time(args.end)
+    except ValueError as e:
+        parser.error(str(e))
+    started = time.perf_counter()
+    count = export(args.db, sensors, args.output, start, end, args.format, args.chunk)
+    elapsed = time.perf_counter() - started
+    print(f"Exported {count} rows as {args.format} in {elapsed:.2f}s ({count / max(elapsed, 1e-9):,.0f} rows/s)",
+          file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
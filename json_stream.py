@@ -0,0 +1,278 @@
+import json
+import os
+import sqlite3
+import tempfile
+
+# Bytes read from the input per refill; grows while a single value does not fit
+CHUNK_SIZE = 1024 * 1024
+# Keys buffered before a spilled KeyIndex writes them to disk
+SPILL_BATCH_SIZE = 10000
+# Characters that may follow a complete JSON number
+NUMBER_DELIMITERS = frozenset(" \t\r\n,}]")
+
+class JsonStreamReader:
+    """Incremental JSON reader that walks nested objects one member at a time.
+
+    Only the value being decoded and one read chunk are held in memory, so
+    multi-gigabyte documents can be traversed with a flat memory profile.
+    """
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        """Read more text into the buffer, dropping what was already consumed."""
+        if self.eof:
+            return False
+        # Read at least as much as is buffered so one huge value costs O(n), not O(n^2)
+        chunk = self.f.read(max(self.chunk_size, len(self.buffer) - self.pos))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def skip_whitespace(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self.fill():
+                return
+
+    def next_char(self):
+        """Consume and return the next non-whitespace character."""
+        self.skip_whitespace()
+        if self.pos >= len(self.buffer):
+            raise ValueError("Unexpected end of JSON input")
+        char = self.buffer[self.pos]
+        self.pos += 1
+        return char
+
+    def peek_char(self):
+        self.skip_whitespace()
+        return self.buffer[self.pos] if self.pos < len(self.buffer) else ""
+
+    def expect(self, expected):
+        char = self.next_char()
+        if char != expected:
+            raise ValueError(f"Expected '{expected}' but found '{char}' in JSON input")
+
+    def read_value(self):
+        """Decode and return the next complete JSON value."""
+        self.skip_whitespace()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number cut by the chunk boundary ("1." or "12e") decodes as its prefix,
+                # so it is only complete once a delimiter follows it
+                truncated = (isinstance(value, (int, float)) and not isinstance(value, bool)
+                             and (end == len(self.buffer) or self.buffer[end] not in NUMBER_DELIMITERS))
+                if (end < len(self.buffer) and not truncated) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    def iter_keys(self):
+        """Yield the keys of the object at the current position.
+
+        After each key the caller must consume its value, either with read_value()
+        or by descending into it with another iter_keys(), before asking for the next.
+        """
+        self.expect("{")
+        if self.peek_char() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(":")
+            yield key
+            char = self.next_char()
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' or '}}' but found '{char}' in JSON input")
+
+    def iter_items(self):
+        """Yield (key, value) pairs of the object at the current position."""
+        for key in self.iter_keys():
+            yield key, self.read_value()
+
+def iter_users(path):
+    """Yield (user_id, user) pairs from table.users of a users JSON file without loading it."""
+    with open(path, "r") as f:
+        reader = JsonStreamReader(f)
+        for key in reader.iter_keys():
+            if key != "table":
+                reader.read_value()
+                continue
+            for table_key in reader.iter_keys():
+                if table_key == "users":
+                    yield from reader.iter_items()
+                else:
+                    reader.read_value()
+
+def dumps_at_level(value, level):
+    """Serialize a value like json.dump(indent=4) would when nested at the given depth."""
+    return json.dumps(value, indent=4).replace("\n", "\n" + "    " * level)
+
+def render_member(key, value, level):
+    """Serialize one '"key": value' member of an indent=4 JSON object nested at the given depth."""
+    return json.dumps(key) + ": " + dumps_at_level(value, level + 1)
+
+def write_object_stream(out, items, level, rendered=False):
+    """Write (key, value) pairs as an indent=4 JSON object nested at the given depth.
+
+    With rendered, items are member strings already produced by render_member().
+    """
+    empty = True
+    for item in items:
+        out.write(("{" if empty else ",") + "\n" + "    " * (level + 1))
+        out.write(item if rendered else render_member(item[0], item[1], level))
+        empty = False
+    out.write("{}" if empty else "\n" + "    " * level + "}")
+
+def write_users_document(src_path, out, merge_users):
+    """Copy a users JSON file to out as indent=4 JSON, streaming table.users through merge_users.
+
+    merge_users receives an iterator of the source (user_id, user) pairs and returns
+    the pairs to write in their place. Everything else in the document is copied as is.
+    """
+    with open(src_path, "r") as f:
+        reader = JsonStreamReader(f)
+
+        def table_items():
+            for table_key in reader.iter_keys():
+                if table_key == "users":
+                    yield table_key, None
+                else:
+                    yield table_key, reader.read_value()
+
+        empty = True
+        for key in reader.iter_keys():
+            out.write(("{" if empty else ",") + "\n    " + json.dumps(key) + ": ")
+            empty = False
+            if key != "table":
+                out.write(dumps_at_level(reader.read_value(), 1))
+                continue
+            table_empty = True
+            for table_key, value in table_items():
+                out.write(("{" if table_empty else ",") + "\n        " + json.dumps(table_key) + ": ")
+                table_empty = False
+                if table_key == "users":
+                    write_object_stream(out, merge_users(reader.iter_items()), 2)
+                else:
+                    out.write(dumps_at_level(value, 2))
+            out.write("{}" if table_empty else "\n    }")
+        out.write("{}" if empty else "\n}")
+
+def write_document_with_users(out, document, users_items, rendered=False):
+    """Write a users document as indent=4 JSON, streaming users_items in place of table.users.
+
+    users_items are (user_id, user) pairs, or render_member() strings with rendered.
+    """
+    empty = True
+    for key, member in document.items():
+        out.write(("{" if empty else ",") + "\n    " + json.dumps(key) + ": ")
+        empty = False
+        if key != "table":
+            out.write(dumps_at_level(member, 1))
+            continue
+        table_empty = True
+        for table_key, table_member in member.items():
+            out.write(("{" if table_empty else ",") + "\n        " + json.dumps(table_key) + ": ")
+            table_empty = False
+            if table_key == "users":
+                write_object_stream(out, users_items, 2, rendered)
+            else:
+                out.write(dumps_at_level(table_member, 2))
+        out.write("{}" if table_empty else "\n    }")
+    out.write("{}" if empty else "\n}")
+
+def read_document_skeleton(path):
+    """Return a users document with every part except the table.users members, read as a stream."""
+    with open(path, "r") as f:
+        reader = JsonStreamReader(f)
+        document = {}
+        for key in reader.iter_keys():
+            if key != "table":
+                document[key] = reader.read_value()
+                continue
+            table = document[key] = {}
+            for table_key in reader.iter_keys():
+                if table_key == "users":
+                    for _ in reader.iter_keys():
+                        reader.read_value()
+                    table[table_key] = {}
+                else:
+                    table[table_key] = reader.read_value()
+        return document
+
+class KeyIndex:
+    """Set of string keys kept in memory up to max_memory_keys, then spilled to an SQLite file."""
+
+    def __init__(self, max_memory_keys, spill_dir=None):
+        self.max_memory_keys = max_memory_keys
+        self.spill_dir = spill_dir
+        self.keys = set()
+        self.conn = None
+        self.path = None
+        self.pending = []
+
+    def spill(self):
+        """Move the in-memory keys into a temporary on-disk index."""
+        fd, self.path = tempfile.mkstemp(prefix="key_index_", suffix=".db", dir=self.spill_dir)
+        os.close(fd)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("pragma journal_mode = off")
+        self.conn.execute("pragma synchronous = off")
+        self.conn.execute("create table keys (key text primary key) without rowid")
+        self.pending = list(self.keys)
+        self.keys = set()
+        self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.conn.executemany("insert or ignore into keys (key) values (?)", ((k,) for k in self.pending))
+            self.conn.commit()
+            self.pending = []
+
+    def add(self, key):
+        if self.conn is None:
+            self.keys.add(key)
+            if len(self.keys) > self.max_memory_keys:
+                self.spill()
+            return
+        self.pending.append(key)
+        if len(self.pending) >= SPILL_BATCH_SIZE:
+            self.flush()
+
+    def __contains__(self, key):
+        if self.conn is None:
+            return key in self.keys
+        self.flush()
+        return self.conn.execute("select 1 from keys where key = ?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        if self.conn is None:
+            return len(self.keys)
+        self.flush()
+        return self.conn.execute("select count(*) from keys").fetchone()[0]
+
+    @property
+    def spilled(self):
+        return self.conn is not None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            os.remove(self.path)
+            self.conn = None
@@ -0,0 +1,247 @@
+import argparse
+import heapq
+import json
+import os
+import pickle
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+from json_stream import dumps_at_level, write_document_with_users
+
+CONFLICT_POLICIES = ["last-wins", "first-wins", "newest-by-field", "deep-merge"]
+
+def parse_users_file(path):
+    """Load one users export. Returns (document without users, users, parse seconds)."""
+    start = time.perf_counter()
+    with open(path, 'r') as f:
+        document = json.load(f)
+    users = document["table"].pop("users")
+    return document, users, time.perf_counter() - start
+
+def deep_merge(base, update):
+    """Merge update into a copy of base, recursing into nested objects; update wins on leaves."""
+    merged = dict(base)
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def field_value(user, field):
+    return user.get(field) if isinstance(user, dict) else None
+
+def is_newer(candidate, current, field):
+    """Check whether candidate's field is at least as new as current's; missing fields are oldest."""
+    return is_newer_value(field_value(candidate, field), field_value(current, field))
+
+def is_newer_value(new_value, old_value):
+    if new_value is None:
+        return old_value is None
+    if old_value is None:
+        return True
+    try:
+        return new_value >= old_value
+    except TypeError:
+        return str(new_value) >= str(old_value)
+
+def merge_into(merged, users, policy, field, stats):
+    """Fold one file's users into merged according to the conflict policy."""
+    for user_id, user in users.items():
+        if user_id not in merged:
+            merged[user_id] = user
+            continue
+        stats["conflicts"] += 1
+        if policy == "last-wins":
+            merged[user_id] = user
+        elif policy == "first-wins":
+            continue
+        elif policy == "newest-by-field":
+            if not is_newer(user, merged[user_id], field):
+                continue
+            merged[user_id] = user
+        elif policy == "deep-merge":
+            if isinstance(user, dict) and isinstance(merged[user_id], dict):
+                merged[user_id] = deep_merge(merged[user_id], user)
+            else:
+                merged[user_id] = user
+        stats["updated"] += 1
+
+def shard_path(shard_dir, name, shard):
+    return os.path.join(shard_dir, f"{name}_{shard}.pickle")
+
+def split_users_file(path, index, shard_dir, shards, field):
+    """Parse one users export and write its users, rendered as JSON, to one file per shard of user IDs.
+
+    Each user travels as (position in the file, user ID, rendered value, value of
+    field): strings cost far less to pass between processes than parsed objects, and
+    rendering happens here in parallel. Returns (document without users for the first
+    file, user count, parse seconds, render seconds, transfer seconds).
+    """
+    document, users, parse_s = parse_users_file(path)
+    start = time.perf_counter()
+    parts = [[] for _ in range(shards)]
+    for position, (user_id, user) in enumerate(users.items()):
+        parts[zlib.crc32(user_id.encode()) % shards].append(
+            (position, user_id, dumps_at_level(user, 3), field_value(user, field)))
+    render_s = time.perf_counter() - start
+    start = time.perf_counter()
+    for shard, part in enumerate(parts):
+        with open(shard_path(shard_dir, index, shard), "wb") as f:
+            pickle.dump(part, f, pickle.HIGHEST_PROTOCOL)
+    return document if index == 0 else None, len(users), parse_s, render_s, time.perf_counter() - start
+
+def reduce_shard(shard_dir, file_count, shard, policy, field):
+    """Merge one shard of every file in input order, as merge_into() would, on rendered users.
+
+    Only deep-merge conflicts between two objects are parsed back and rendered again.
+    The members are written sorted by where each user first appeared, (file, position),
+    which is the order a sequential dict merge produces. Returns (stats, transfer seconds).
+    """
+    stats = {"conflicts": 0, "updated": 0}
+    transfer_s = 0.0
+    merged = {}  # user_id -> [(file, position) of first appearance, rendered value, field value]
+    for index in range(file_count):
+        start = time.perf_counter()
+        with open(shard_path(shard_dir, index, shard), "rb") as f:
+            part = pickle.load(f)
+        transfer_s += time.perf_counter() - start
+        for position, user_id, text, newest in part:
+            current = merged.get(user_id)
+            if current is None:
+                merged[user_id] = [(index, position), text, newest]
+                continue
+            stats["conflicts"] += 1
+            if policy == "first-wins":
+                continue
+            if policy == "newest-by-field" and not is_newer_value(newest, current[2]):
+                continue
+            if policy == "deep-merge" and text.startswith("{") and current[1].startswith("{"):
+                user = deep_merge(json.loads(current[1]), json.loads(text))
+                text, newest = dumps_at_level(user, 3), field_value(user, field)
+            current[1], current[2] = text, newest
+            stats["updated"] += 1
+
+    start = time.perf_counter()
+    # merged keeps first-insertion order, which is already ascending (file, position)
+    members = [(first, json.dumps(user_id) + ": " + text) for user_id, (first, text, _) in merged.items()]
+    with open(shard_path(shard_dir, "merged", shard), "wb") as f:
+        pickle.dump(members, f, pickle.HIGHEST_PROTOCOL)
+    transfer_s += time.perf_counter() - start
+    return stats, transfer_s
+
+def merge_users_sequential(paths, out_path, policy, field, stats):
+    """Parse and merge in this process; with one worker there is nothing to overlap."""
+    start = time.perf_counter()
+    document = None
+    merged = {}
+    for path in paths:
+        file_document, users, parse_s = parse_users_file(path)
+        stats["parse_s"][path] = round(parse_s, 3)
+        if document is None:
+            document = file_document
+        merge_into(merged, users, policy, field, stats)
+    stats["parse_and_reduce_s"] = round(time.perf_counter() - start, 3)
+
+    write_start = time.perf_counter()
+    document["table"]["users"] = merged
+    with open(out_path, 'w') as outfile:
+        json.dump(document, outfile, indent=4)
+    stats["write_s"] = round(time.perf_counter() - write_start, 3)
+    stats["users"] = len(merged)
+
+def merge_users_partitioned(paths, out_path, policy, field, stats, workers):
+    """Hash-partition user IDs so every worker merges its own shard.
+
+    Workers render users to JSON while splitting their file and exchange them as text
+    through per-shard pickle files in a temporary directory, instead of returning whole
+    parsed files to this process. Only a k-way merge of text is left to this process.
+    """
+    transfer_s = 0.0
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="merge_users_") as shard_dir, \
+            ProcessPoolExecutor(max_workers=workers) as executor:
+        document = None
+        for path, (file_document, count, parse_s, render_s, split_s) in zip(paths, executor.map(
+                split_users_file, paths, range(len(paths)), [shard_dir] * len(paths), [workers] * len(paths),
+                [field] * len(paths))):
+            stats["parse_s"][path] = round(parse_s, 3)
+            stats["render_s"] = round(stats.get("render_s", 0.0) + render_s, 3)
+            transfer_s += split_s
+            if file_document is not None:
+                document = file_document
+        stats["parse_and_split_s"] = round(time.perf_counter() - start, 3)
+
+        reduce_start = time.perf_counter()
+        for shard_stats, shard_transfer_s in executor.map(
+                reduce_shard, [shard_dir] * workers, [len(paths)] * workers, range(workers),
+                [policy] * workers, [field] * workers):
+            stats["conflicts"] += shard_stats["conflicts"]
+            stats["updated"] += shard_stats["updated"]
+            transfer_s += shard_transfer_s
+        stats["reduce_s"] = round(time.perf_counter() - reduce_start, 3)
+        stats["parse_and_reduce_s"] = round(time.perf_counter() - start, 3)
+
+        write_start = time.perf_counter()
+        shards = []
+        for shard in range(workers):
+            load_start = time.perf_counter()
+            with open(shard_path(shard_dir, "merged", shard), "rb") as f:
+                shards.append(pickle.load(f))
+            transfer_s += time.perf_counter() - load_start
+        stats["users"] = sum(len(shard) for shard in shards)
+        members = (text for _, text in heapq.merge(*shards, key=itemgetter(0)))
+        document["table"]["users"] = {}
+        with open(out_path, 'w') as outfile:
+            write_document_with_users(outfile, document, members, rendered=True)
+        stats["write_s"] = round(time.perf_counter() - write_start, 3)
+    stats["transfer_s"] = round(transfer_s, 3)
+
+def merge_users_files(paths, out_path, policy="last-wins", field="updated_at", workers=None):
+    """Merge users exports in input order, in parallel when there are several workers.
+
+    Returns the merge statistics.
+    """
+    stats = {"files": len(paths), "users": 0, "conflicts": 0, "updated": 0, "parse_s": {}}
+    start = time.perf_counter()
+    workers = workers or min(len(paths), os.cpu_count() or 1)
+    if workers > 1:
+        merge_users_partitioned(paths, out_path, policy, field, stats, workers)
+    else:
+        merge_users_sequential(paths, out_path, policy, field, stats)
+    stats["workers"] = workers
+    stats["total_s"] = round(time.perf_counter() - start, 3)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge any number of users exports into one file")
+    parser.add_argument("inputs", nargs="+", help="Users JSON files, merged in the given order")
+    parser.add_argument("-o", "--output", default="merged_users.json", help="Merged output file")
+    parser.add_argument("--policy", choices=CONFLICT_POLICIES, default="last-wins",
+                        help="How to resolve a user ID present in several files")
+    parser.add_argument("--field", default="updated_at", help="Timestamp field used by newest-by-field")
+    parser.add_argument("--workers", type=int, help="Worker processes and user ID shards "
+                        "(default: one per file, up to CPU count; 1 merges in this process)")
+    args = parser.parse_args()
+
+    stats = merge_users_files(args.inputs, args.output, args.policy, args.field, args.workers)
+    slowest = max(stats["parse_s"].values())
+    print(f"Merged {stats['files']} files into {args.output}: {stats['users']} users, "
+          f"{stats['conflicts']} conflicts ({stats['updated']} updated from a later file, policy {args.policy})")
+    for path, parse_s in stats["parse_s"].items():
+        print(f"  parse {path}: {parse_s:.3f}s")
+    if "transfer_s" in stats:
+        print(f"  parse + render + split: {stats['parse_and_split_s']:.3f}s (slowest single parse {slowest:.3f}s, "
+              f"render {stats['render_s']:.3f}s summed over files)")
+        print(f"  reduce: {stats['reduce_s']:.3f}s")
+        print(f"  transfer between processes: {stats['transfer_s']:.3f}s (summed over {stats['workers']} workers)")
+    else:
+        print(f"  parse + reduce: {stats['parse_and_reduce_s']:.3f}s in one process "
+              f"(slowest single parse {slowest:.3f}s)")
+    print(f"  write: {stats['write_s']:.3f}s")
+    print(f"  total: {stats['total_s']:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+import argparse
+import asyncio
+import random
+import struct
+import threading
+import time
+import uuid
+
+# Broker Configuration
+BROKER_HOST = "127.0.0.1"
+BROKER_PORT = 1883
+KEEPALIVE_GRACE = 1.5  # Clients are dropped after this many keepalive periods of silence
+
+# MQTT 3.1.1 control packet types
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+def encode_length(length):
+    """Encode an MQTT remaining length as a variable byte integer."""
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+def encode_string(value):
+    data = value.encode() if isinstance(value, str) else value
+    return struct.pack("!H", len(data)) + data
+
+def decode_string(data, pos):
+    length = struct.unpack_from("!H", data, pos)[0]
+    return data[pos + 2:pos + 2 + length].decode(), pos + 2 + length
+
+def topic_matches(topic_filter, topic):
+    """Check one topic against one filter; the linear reference the trie is measured against."""
+    if topic.startswith("$") and topic_filter[:1] in ("+", "#"):
+        return False
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    for i, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if i >= len(topic_levels) or (level != "+" and level != topic_levels[i]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+class TrieNode:
+    __slots__ = ("children", "subscribers")
+
+    def __init__(self):
+        self.children = {}
+        self.subscribers = {}  # subscriber -> granted QoS
+
+class TopicTrie:
+    """Subscriptions indexed by topic level, with "+" and "#" as ordinary child keys.
+
+    Matching a topic walks at most the exact, "+" and "#" branch at each level, so
+    its cost depends on the topic depth and the number of matching subscriptions,
+    not on how many subscriptions exist in total.
+    """
+
+    def __init__(self):
+        self.root = TrieNode()
+
+    def subscribe(self, topic_filter, subscriber, qos):
+        node = self.root
+        for level in topic_filter.split("/"):
+            node = node.children.setdefault(level, TrieNode())
+        node.subscribers[subscriber] = qos
+
+    def unsubscribe(self, topic_filter, subscriber):
+        """Remove a subscription and prune the branches it leaves empty."""
+        path = [self.root]
+        for level in topic_filter.split("/"):
+            node = path[-1].children.get(level)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].subscribers.pop(subscriber, None)
+        levels = topic_filter.split("/")
+        for depth in range(len(levels), 0, -1):
+            node = path[depth]
+            if node.subscribers or node.children:
+                break
+            del path[depth - 1].children[levels[depth - 1]]
+
+    def match(self, topic):
+        """Return {subscriber: highest granted QoS} over all filters matching topic."""
+        matched = {}
+
+        def collect(node):
+            for subscriber, qos in node.subscribers.items():
+                if matched.get(subscriber, -1) < qos:
+                    matched[subscriber] = qos
+
+        levels = topic.split("/")
+        # Wildcards at the first level do not match topics starting with "$"
+        wildcards = not topic.startswith("$")
+        nodes = [self.root]
+        for level in levels:
+            next_nodes = []
+            for node in nodes:
+                children = node.children
+                if wildcards:
+                    multi = children.get("#")
+                    if multi is not None:
+                        collect(multi)
+                    single = children.get("+")
+                    if single is not None:
+                        next_nodes.append(single)
+                child = children.get(level)
+                if child is not None:
+                    next_nodes.append(child)
+            if not next_nodes:
+                return matched
+            nodes = next_nodes
+            wildcards = True
+        for node in nodes:
+            collect(node)
+            # "a/#" also matches "a" itself
+            multi = node.children.get("#")
+            if multi is not None:
+                collect(multi)
+        return matched
+
+class Session:
+    """One connected client."""
+
+    def __init__(self, client_id, writer):
+        self.client_id = client_id
+        self.writer = writer
+        self.subscriptions = set()
+        self.next_packet_id = 0
+
+    def send(self, packet_type, flags, body):
+        self.writer.write(bytes([packet_type << 4 | flags]) + encode_length(len(body)) + body)
+
+    def send_publish(self, topic, payload, qos, retain):
+        flags = qos << 1 | int(retain)
+        if qos:
+            self.next_packet_id = self.next_packet_id % 65535 + 1
+            body = encode_string(topic) + struct.pack("!H", self.next_packet_id) + payload
+        else:
+            body = encode_string(topic) + payload
+        self.send(PUBLISH, flags, body)
+
+class LocalBroker:
+    """Minimal MQTT 3.1.1 broker for offline testing and benchmarks.
+
+    Supports CONNECT, SUBSCRIBE/UNSUBSCRIBE, PUBLISH at QoS 0 and 1 (QoS 2
+    publishes are acknowledged and routed at QoS 1), retained messages, PINGREQ
+    and DISCONNECT. Sessions are always clean and outgoing QoS 1 messages are not
+    retransmitted, which is enough for paho clients on a local socket.
+    """
+
+    def __init__(self, host=BROKER_HOST, port=BROKER_PORT):
+        self.host = host
+        self.port = port
+        self.trie = TopicTrie()
+        self.sessions = {}
+        self.retained = {}
+        self.stats = {"connections": 0, "received": 0, "delivered": 0}
+        self.loop = None
+        self.server = None
+        self.thread = None
+
+    def route(self, topic, payload, qos, retain):
+        """Deliver a message to every matching subscriber and update the retained store."""
+        self.stats["received"] += 1
+        if retain:
+            if payload:
+                self.retained[topic] = (payload, qos)
+            else:
+                self.retained.pop(topic, None)
+        for session, granted in self.trie.match(topic).items():
+            session.send_publish(topic, payload, min(qos, granted), False)
+            self.stats["delivered"] += 1
+
+    def subscribe(self, session, topic_filter, qos):
+        self.trie.subscribe(topic_filter, session, qos)
+        session.subscriptions.add(topic_filter)
+        for topic, (payload, retained_qos) in self.retained.items():
+            if topic_matches(topic_filter, topic):
+                session.send_publish(topic, payload, min(qos, retained_qos), True)
+
+    def drop_session(self, session):
+        for topic_filter in session.subscriptions:
+            self.trie.unsubscribe(topic_filter, session)
+        if self.sessions.get(session.client_id) is session:
+            del self.sessions[session.client_id]
+
+    async def read_packet(self, reader, timeout):
+        header = await asyncio.wait_for(reader.readexactly(1), timeout)
+        length, multiplier = 0, 1
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        return header[0] >> 4, header[0] & 0x0F, await reader.readexactly(length)
+
+    def accept_connect(self, body, writer):
+        """Parse CONNECT, answer CONNACK and return the new session, or None if refused."""
+        protocol, pos = decode_string(body, 0)
+        level, flags = body[pos], body[pos + 1]
+        keepalive = struct.unpack_from("!H", body, pos + 2)[0]
+        if protocol not in ("MQTT", "MQIsdp") or level not in (3, 4):
+            writer.write(bytes([CONNACK << 4, 2, 0, 1]))  # Unacceptable protocol version
+            return None, 0
+        if flags & 0x01:
+            # MQTT 3.1.1 requires the reserved flag to be zero and the connection closed otherwise
+            return None, 0
+        client_id, _ = decode_string(body, pos + 4)
+        client_id = client_id or f"auto-{uuid.uuid4().hex[:12]}"
+        previous = self.sessions.get(client_id)
+        if previous is not None:
+            # A second connection with the same client ID takes the session over
+            previous.writer.close()
+            self.drop_session(previous)
+        session = Session(client_id, writer)
+        self.sessions[client_id] = session
+        self.stats["connections"] += 1
+        writer.write(bytes([CONNACK << 4, 2, 0, 0]))
+        return session, keepalive
+
+    async def handle_client(self, reader, writer):
+        session = None
+        try:
+            packet_type, _, body = await self.read_packet(reader, 10)
+            if packet_type != CONNECT:
+                return
+            session, keepalive = self.accept_connect(body, writer)
+            if session is None:
+                return
+            timeout = keepalive * KEEPALIVE_GRACE if keepalive else None
+            while True:
+                packet_type, flags, body = await self.read_packet(reader, timeout)
+                if packet_type == PUBLISH:
+                    qos, retain = (flags >> 1) & 3, bool(flags & 1)
+                    topic, pos = decode_string(body, 0)
+                    if qos:
+                        packet_id = body[pos:pos + 2]
+                        pos += 2
+                    self.route(topic, body[pos:], min(qos, 1), retain)
+                    if qos == 1:
+                        session.send(PUBACK, 0, packet_id)
+                    elif qos == 2:
+                        session.send(PUBREC, 0, packet_id)
+                elif packet_type == PUBREL:
+                    session.send(PUBCOMP, 0, body[:2])
+                elif packet_type == SUBSCRIBE:
+                    packet_id, pos = body[:2], 2
+                    requests = []
+                    while pos < len(body):
+                        topic_filter, pos = decode_string(body, pos)
+                        requests.append((topic_filter, min(body[pos], 1)))
+                        pos += 1
+                    # SUBACK goes out before the retained messages it unlocks
+                    session.send(SUBACK, 0, packet_id + bytes(qos for _, qos in requests))
+                    for topic_filter, qos in requests:
+                        self.subscribe(session, topic_filter, qos)
+                elif packet_type == UNSUBSCRIBE:
+                    packet_id, pos = body[:2], 2
+                    while pos < len(body):
+                        topic_filter, pos = decode_string(body, pos)
+                        self.trie.unsubscribe(topic_filter, session)
+                        session.subscriptions.discard(topic_filter)
+                    session.send(UNSUBACK, 0, packet_id)
+                elif packet_type == PINGREQ:
+                    session.send(PINGRESP, 0, b"")
+                elif packet_type == DISCONNECT:
+                    return
+                # PUBACK, PUBREC and PUBCOMP for outgoing messages need no action without retransmission
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, IndexError, struct.error):
+            pass
+        finally:
+            if session is not None:
+                self.drop_session(session)
+            writer.close()
+
+    async def serve(self, ready=None):
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        if ready is not None:
+            ready.set()
+        async with self.server:
+            try:
+                await self.server.serve_forever()
+            except asyncio.CancelledError:
+                pass  # stop() closed the server
+
+    def start(self):
+        """Run the broker on its own event loop thread. Returns the port it listens on."""
+        ready = threading.Event()
+        self.thread = threading.Thread(target=lambda: asyncio.run(self.serve(ready)), daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self.port
+
+    def stop(self):
+        """Close the server and every client connection, and wait for the broker thread to exit."""
+        if self.loop is not None:
+            for session in list(self.sessions.values()):
+                self.loop.call_soon_threadsafe(session.writer.close)
+            self.loop.call_soon_threadsafe(self.server.close)
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+def routing_benchmark(subscription_counts=(100, 1000, 10000, 100000), lookups=20000):
+    """Compare trie matching with a linear scan over all filters for growing subscription counts."""
+    random.seed(1)
+    sensors = ["Temperature", "Humidity", "Pressure"]
+
+    def random_topic():
+        return f"Home/Room{random.randrange(1000)}/Device{random.randrange(100)}/{random.choice(sensors)}"
+
+    def random_filter():
+        levels = random_topic().split("/")
+        kind = random.random()
+        if kind < 0.1:
+            return "/".join(levels[:random.randrange(2, 4)]) + "/#"
+        if kind < 0.3:
+            levels[random.randrange(1, 4)] = "+"
+        return "/".join(levels)
+
+    topics = [random_topic() for _ in range(lookups)]
+    print(f"{'subscriptions':>13}  {'trie':>14}  {'linear scan':>14}  {'speedup':>7}  matches/topic")
+    for count in subscription_counts:
+        filters = [(random_filter(), i) for i in range(count)]
+        trie = TopicTrie()
+        for topic_filter, subscriber in filters:
+            trie.subscribe(topic_filter, subscriber, 0)
+
+        start = time.perf_counter()
+        matched = sum(len(trie.match(topic)) for topic in topics)
+        trie_s = (time.perf_counter() - start) / len(topics)
+
+        # The scan is quadratic in spirit, so time it on a sample of the topics
+        sample = topics[:max(10, len(topics) * 1000 // count)]
+        start = time.perf_counter()
+        scanned = sum(len({s for f, s in filters if topic_matches(f, topic)}) for topic in sample)
+        scan_s = (time.perf_counter() - start) / len(sample)
+        assert scanned == sum(len(trie.match(topic)) for topic in sample)
+
+        print(f"{count:>13}  {trie_s * 1e6:>9.2f} us/op  {scan_s * 1e6:>9.2f} us/op  "
+              f"{scan_s / trie_s:>6.0f}x  {matched / len(topics):.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Minimal local MQTT 3.1.1 broker")
+    parser.add_argument("--host", default=BROKER_HOST)
+    parser.add_argument("--port", type=int, default=BROKER_PORT)
+    parser.add_argument("--benchmark", action="store_true", help="Run the topic routing micro-benchmark and exit")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        routing_benchmark()
+        return
+    broker = LocalBroker(args.host, args.port)
+    print(f"Local MQTT broker listening on {args.host}:{args.port}")
+    try:
+        asyncio.run(broker.serve())
+    except KeyboardInterrupt:
+        print(f"Broker stopped: {broker.stats}")
+
+if __name__ == "__main__":
+    main()
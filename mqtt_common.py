@@ -0,0 +1,217 @@
+import collections
+import os
+import socket
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+# Client Tuning Configuration
+MAX_INFLIGHT_MESSAGES = 100  # QoS 1/2 messages awaiting acknowledgement (paho's default is 20)
+MAX_QUEUED_MESSAGES = 10000  # Messages paho holds beyond the in-flight window; publish() fails past this
+SOCKET_BUFFER_SIZE = 256 * 1024
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+LATENCY_SAMPLES = 10000  # Ack latencies kept between two metrics snapshots
+
+# MQTT_BROKER / MQTT_PORT in the environment override every script's broker, e.g. to
+# point them all at a local mqtt_broker.py
+BROKER_OVERRIDE = os.environ.get("MQTT_BROKER")
+PORT_OVERRIDE = os.environ.get("MQTT_PORT")
+
+def broker_address(host, port=1883):
+    """Return the (host, port) to connect to, applying the environment overrides."""
+    return BROKER_OVERRIDE or host, int(PORT_OVERRIDE or port)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else float("nan")
+
+class ClientMetrics:
+    """Publish rate, ack latency, in-flight and queued depth and receive rate of one client.
+
+    depth is a callable returning (in flight, queued): messages sent and awaiting their
+    acknowledgement, and messages accepted by publish() but still waiting for a slot in
+    the in-flight window. Without it every sent, unacknowledged message counts as in flight.
+    """
+
+    def __init__(self, depth=None):
+        self.lock = threading.Lock()
+        self.depth_func = depth
+        self.sent_at = {}  # mid -> time the packet was sent, for unacknowledged messages
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.published = 0
+        self.acked = 0
+        self.received = 0
+        self.max_inflight = 0
+        self.max_queued = 0
+        self.window = (time.perf_counter(), 0, 0)  # Start, published and received at the last snapshot
+
+    def depth(self):
+        """Return (in flight, queued) message counts."""
+        if self.depth_func is not None:
+            return self.depth_func()
+        with self.lock:
+            return len(self.sent_at), 0
+
+    def record_published(self):
+        queued = self.depth()[1]
+        with self.lock:
+            self.published += 1
+            self.max_queued = max(self.max_queued, queued)
+
+    def record_sent(self, mid, sent_at):
+        """Start timing mid's acknowledgement from the moment its packet goes out."""
+        inflight = self.depth()[0]
+        with self.lock:
+            self.sent_at[mid] = sent_at
+            self.max_inflight = max(self.max_inflight, inflight)
+
+    def discard_sent(self, mid):
+        with self.lock:
+            self.sent_at.pop(mid, None)
+
+    def record_ack(self, mid):
+        now = time.perf_counter()
+        with self.lock:
+            sent = self.sent_at.pop(mid, None)
+            if sent is None:
+                return
+            self.latencies.append(now - sent)
+            self.acked += 1
+
+    def record_received(self):
+        with self.lock:
+            self.received += 1
+
+    def inflight(self):
+        return self.depth()[0]
+
+    def snapshot(self):
+        """Return rates and ack latency percentiles since the previous snapshot."""
+        now = time.perf_counter()
+        inflight, queued = self.depth()
+        with self.lock:
+            start, published, received = self.window
+            latencies = list(self.latencies)
+            self.latencies.clear()
+            self.window = (now, self.published, self.received)
+            elapsed = max(now - start, 1e-9)
+            return {
+                "publish_rate": (self.published - published) / elapsed,
+                "receive_rate": (self.received - received) / elapsed,
+                "ack_p50_ms": percentile(latencies, 0.5) * 1000,
+                "ack_p99_ms": percentile(latencies, 0.99) * 1000,
+                "inflight": inflight,
+                "queued": queued,
+                "published": self.published,
+                "acked": self.acked,
+                "received": self.received,
+            }
+
+    def report(self):
+        """One-line summary of a snapshot."""
+        s = self.snapshot()
+        return (f"publish {s['publish_rate']:.1f} msg/s, ack p50 {s['ack_p50_ms']:.2f} ms "
+                f"p99 {s['ack_p99_ms']:.2f} ms, in-flight {s['inflight']}, queued {s['queued']}, receive {s['receive_rate']:.1f} msg/s "
+                f"(totals: {s['published']} published, {s['acked']} acked, {s['received']} received)")
+
+class TunedClient(mqtt.Client):
+    """paho client with the shared tuning applied and metrics recorded on every publish and receive.
+
+    Callbacks use the VERSION2 signatures. Scripts assign on_publish, on_message and
+    on_socket_open as usual; the client records its metrics and then calls them.
+    """
+
+    def __init__(self, client_id="", clean_session=True, userdata=None, protocol=mqtt.MQTTv311,
+                 max_inflight=MAX_INFLIGHT_MESSAGES, max_queued=MAX_QUEUED_MESSAGES,
+                 socket_buffer_size=SOCKET_BUFFER_SIZE):
+        self.metrics = ClientMetrics(depth=self.message_depth)
+        self.socket_buffer_size = socket_buffer_size
+        self.user_on_publish = None
+        self.user_on_message = None
+        self.user_on_socket_open = None
+        super().__init__(mqtt.CallbackAPIVersion.VERSION2, client_id, clean_session=clean_session,
+                         userdata=userdata, protocol=protocol)
+        self.max_inflight_messages_set(max_inflight)
+        self.max_queued_messages_set(max_queued)
+        self.reconnect_delay_set(RECONNECT_MIN_DELAY, RECONNECT_MAX_DELAY)
+
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        info = super().publish(topic, payload, qos, retain, properties)
+        if info.rc == mqtt.MQTT_ERR_SUCCESS:
+            self.metrics.record_published()
+        return info
+
+    def _send_publish(self, mid, *args, **kwargs):
+        # paho calls this when a PUBLISH packet actually goes out, from publish() or once
+        # an ack frees a slot for a queued message, so ack latency excludes queue time
+        self.metrics.record_sent(mid, time.perf_counter())
+        rc = super()._send_publish(mid, *args, **kwargs)
+        if rc != mqtt.MQTT_ERR_SUCCESS:
+            self.metrics.discard_sent(mid)
+        return rc
+
+    def message_depth(self):
+        """(in flight, queued) from paho's own counters; QoS 0 messages are never queued."""
+        inflight = self._inflight_messages
+        return inflight, max(0, len(self._out_messages) - inflight)
+
+    # paho looks its callbacks up through these properties on every dispatch
+    @property
+    def on_publish(self):
+        return self.handle_publish
+
+    @on_publish.setter
+    def on_publish(self, func):
+        self.user_on_publish = func
+
+    @property
+    def on_message(self):
+        return self.handle_message
+
+    @on_message.setter
+    def on_message(self, func):
+        self.user_on_message = func
+
+    @property
+    def on_socket_open(self):
+        return self.handle_socket_open
+
+    @on_socket_open.setter
+    def on_socket_open(self, func):
+        self.user_on_socket_open = func
+
+    def handle_publish(self, client, userdata, mid, reason_code, properties):
+        self.metrics.record_ack(mid)
+        if self.user_on_publish is not None:
+            self.user_on_publish(client, userdata, mid, reason_code, properties)
+
+    def handle_message(self, client, userdata, message):
+        self.metrics.record_received()
+        if self.user_on_message is not None:
+            self.user_on_message(client, userdata, message)
+
+    def handle_socket_open(self, client, userdata, sock):
+        # Small sensor messages should not wait for Nagle; larger buffers absorb publish bursts
+        if sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.socket_buffer_size:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.socket_buffer_size)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.socket_buffer_size)
+        if self.user_on_socket_open is not None:
+            self.user_on_socket_open(client, userdata, sock)
+
+def create_client(client_id="", clean_session=True, **tuning):
+    """Create a TunedClient. Use clean_session=False with a stable client_id where QoS 1
+    messages sent while the client is offline must be redelivered."""
+    return TunedClient(client_id, clean_session=clean_session, **tuning)
+
+def log_metrics_periodically(client, interval, log=print):
+    """Log the client's metrics every interval seconds from a daemon thread."""
+    def run():
+        while True:
+            time.sleep(interval)
+            log(f"MQTT metrics: {client.metrics.report()}")
+
+    threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,162 @@
+import sqlite3
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+# Outbound Buffer Configuration
+OUTBOUND_BUFFER_PATH = "outbound_buffer.db"
+OUTBOUND_MAX_MESSAGES = 10000  # Oldest messages are dropped beyond this
+OUTBOUND_TTL = 3600  # Seconds a buffered message stays worth sending; None keeps it forever
+REPLAY_RATE = 50  # Messages per second replayed after a reconnect; 0 replays as fast as possible
+REPLAY_BATCH_SIZE = 100
+REPLAY_POLL_INTERVAL = 0.5  # Seconds between connection checks while idle
+
+class OutboundBuffer:
+    """Disk-backed, size-bounded queue of messages published while the broker is unreachable.
+
+    publish() sends straight through when the client is connected and nothing is
+    waiting; otherwise the message is appended to an SQLite table so it survives a
+    restart. A replay thread drains the table in order at REPLAY_RATE once the
+    client is connected again, removing each row when paho reports it published
+    (PUBACK for QoS 1). Rows still unacknowledged when the link drops again are
+    replayed once more, so delivery is at-least-once.
+
+    Topics in coalesce_topics carry a latest value only: buffering a new message
+    on one of them replaces the one already waiting.
+    """
+
+    def __init__(self, path=OUTBOUND_BUFFER_PATH, max_messages=OUTBOUND_MAX_MESSAGES, ttl=OUTBOUND_TTL,
+                 replay_rate=REPLAY_RATE, coalesce_topics=()):
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self.replay_rate = replay_rate
+        self.coalesce_topics = set(coalesce_topics)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("pragma journal_mode = wal")
+        self.conn.execute("pragma synchronous = normal")
+        self.conn.executescript("""
+            create table if not exists outbound (
+              id integer primary key autoincrement,
+              topic text not null,
+              payload blob,
+              qos integer not null,
+              retain integer not null,
+              created real not null
+            );
+            create index if not exists outbound_topic on outbound (topic);
+        """)
+        self.conn.commit()
+        self.pending = self.conn.execute("select count(*) from outbound").fetchone()[0]
+        self.inflight = {}  # Row id -> MQTTMessageInfo of replayed, unacknowledged messages
+        self.last_sent_id = 0
+        self.stats = {"direct": 0, "buffered": 0, "coalesced": 0, "replayed": 0, "expired": 0, "dropped": 0}
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def publish(self, client, topic, payload, qos=0, retain=False):
+        """Publish now if possible, else buffer. Returns the MQTTMessageInfo, or None when buffered."""
+        with self.lock:
+            if self.pending == 0 and client.is_connected():
+                info = client.publish(topic, payload, qos=qos, retain=retain)
+                if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                    self.stats["direct"] += 1
+                    return info
+            self.store(topic, payload, qos, retain)
+        self.wakeup.set()
+        return None
+
+    def store(self, topic, payload, qos, retain):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        if topic in self.coalesce_topics:
+            replaced = self.conn.execute("delete from outbound where topic = ?", (topic,)).rowcount
+            self.pending -= replaced
+            self.stats["coalesced"] += replaced
+        self.conn.execute("insert into outbound (topic, payload, qos, retain, created) values (?, ?, ?, ?, ?)",
+                          (topic, payload, qos, int(retain), time.time()))
+        self.pending += 1
+        self.stats["buffered"] += 1
+        if self.pending > self.max_messages:
+            dropped = self.conn.execute("delete from outbound where id in "
+                                        "(select id from outbound order by id limit ?)",
+                                        (self.pending - self.max_messages,)).rowcount
+            self.pending -= dropped
+            self.stats["dropped"] += dropped
+        self.conn.commit()
+
+    def expire(self):
+        """Delete messages older than the TTL."""
+        if self.ttl is None:
+            return
+        expired = self.conn.execute("delete from outbound where created < ?", (time.time() - self.ttl,)).rowcount
+        if expired:
+            self.pending -= expired
+            self.stats["expired"] += expired
+            self.conn.commit()
+
+    def collect_acks(self):
+        """Delete replayed rows that paho has finished delivering."""
+        done = [row_id for row_id, info in self.inflight.items() if info.is_published()]
+        if done:
+            for row_id in done:
+                del self.inflight[row_id]
+            deleted = self.conn.executemany("delete from outbound where id = ?", ((i,) for i in done)).rowcount
+            self.pending -= deleted
+            self.conn.commit()
+
+    def replay_batch(self, client):
+        """Send the next batch of buffered messages at the replay rate. Returns the number sent."""
+        with self.lock:
+            self.collect_acks()
+            if not client.is_connected():
+                # Anything not acknowledged before the link dropped is sent again
+                self.inflight.clear()
+                self.last_sent_id = 0
+                return 0
+            self.expire()
+            rows = self.conn.execute("select id, topic, payload, qos, retain from outbound where id > ? "
+                                     "order by id limit ?", (self.last_sent_id, REPLAY_BATCH_SIZE)).fetchall()
+        interval = 1.0 / self.replay_rate if self.replay_rate else 0.0
+        start = time.perf_counter()
+        sent = 0
+        for row_id, topic, payload, qos, retain in rows:
+            if interval:
+                time.sleep(max(0.0, start + sent * interval - time.perf_counter()))
+            with self.lock:
+                if self.stopping.is_set() or not client.is_connected():
+                    break
+                info = client.publish(topic, payload, qos=qos, retain=bool(retain))
+                if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                    break
+                self.inflight[row_id] = info
+                self.last_sent_id = row_id
+                self.stats["replayed"] += 1
+            sent += 1
+        return sent
+
+    def replay_loop(self, client):
+        while not self.stopping.is_set():
+            if not self.replay_batch(client):
+                self.wakeup.wait(REPLAY_POLL_INTERVAL)
+                self.wakeup.clear()
+
+    def start(self, client):
+        """Start replaying buffered messages through client whenever it is connected."""
+        self.thread = threading.Thread(target=self.replay_loop, args=(client,), daemon=True)
+        self.thread.start()
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, pending=self.pending, inflight=len(self.inflight))
+
+    def close(self):
+        self.stopping.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+        with self.lock:
+            self.collect_acks()
+            self.conn.close()
@@ -0,0 +1,149 @@
+import math
+import time
+from collections import deque
+
+# Analytics Configuration
+EWMA_ALPHA = 0.1  # Weight of the newest reading in the moving mean and variance
+ROLLING_WINDOW = 60  # Readings covered by the rolling min/max
+WARMUP_READINGS = 10  # Statistical rules stay quiet until a sensor has this many readings
+ALERT_COOLDOWN = 60  # Seconds before the same rule may alert again for the same sensor
+
+# Rule kinds: the reading crosses a fixed limit, deviates from the sensor's EWMA by
+# more than limit standard deviations, moves by more than limit since the previous
+# reading, or the rolling window spans more than limit between its min and max
+RULE_KINDS = ("above", "below", "zscore", "jump", "spread")
+
+class SensorState:
+    """O(1)-update statistics of one sensor: EWMA mean/variance and a rolling min/max."""
+
+    __slots__ = ("count", "mean", "variance", "last", "minima", "maxima")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.variance = 0.0
+        self.last = None
+        # Monotonic queues of (reading number, value): the front is the window's min or max
+        self.minima = deque()
+        self.maxima = deque()
+
+    def zscore(self, value):
+        """Deviation of value from the mean so far, in standard deviations."""
+        if self.variance <= 0:
+            return 0.0
+        return (value - self.mean) / math.sqrt(self.variance)
+
+    def update(self, value):
+        if self.count == 0:
+            self.mean = value
+        else:
+            diff = value - self.mean
+            increment = EWMA_ALPHA * diff
+            self.mean += increment
+            self.variance = (1 - EWMA_ALPHA) * (self.variance + diff * increment)
+        self.last = value
+        self.count += 1
+
+        oldest = self.count - ROLLING_WINDOW
+        while self.minima and self.minima[-1][1] >= value:
+            self.minima.pop()
+        self.minima.append((self.count, value))
+        if self.minima[0][0] <= oldest:
+            self.minima.popleft()
+        while self.maxima and self.maxima[-1][1] <= value:
+            self.maxima.pop()
+        self.maxima.append((self.count, value))
+        if self.maxima[0][0] <= oldest:
+            self.maxima.popleft()
+
+    @property
+    def minimum(self):
+        return self.minima[0][1]
+
+    @property
+    def maximum(self):
+        return self.maxima[0][1]
+
+class AnomalyDetector:
+    """Evaluates configured rules against every reading using in-memory per-sensor state.
+
+    rules is a list of dicts with "field" (Temperature, Humidity, ...), "kind" (one
+    of RULE_KINDS) and "limit", and optionally a "name" used in the alert.
+    """
+
+    def __init__(self, rules):
+        self.rules = {}
+        for rule in rules:
+            if rule["kind"] not in RULE_KINDS:
+                raise ValueError(f"Unknown alert rule kind {rule['kind']!r}, expected one of {', '.join(RULE_KINDS)}")
+            rule = dict(rule, name=rule.get("name") or f"{rule['field']} {rule['kind']} {rule['limit']}")
+            self.rules.setdefault(rule["field"], []).append(rule)
+        self.states = {}
+        self.last_alert = {}
+        self.stats = {"readings": 0, "alerts": 0, "suppressed": 0}
+
+    def check(self, rule, state, value):
+        """Return the observed quantity if the rule fires for value, else None."""
+        kind, limit = rule["kind"], rule["limit"]
+        if kind == "above":
+            return value if value > limit else None
+        if kind == "below":
+            return value if value < limit else None
+        if state.count < WARMUP_READINGS:
+            return None
+        if kind == "zscore":
+            z = state.zscore(value)
+            return z if abs(z) > limit else None
+        if kind == "jump":
+            change = value - state.last
+            return change if abs(change) > limit else None
+        spread = max(state.maximum, value) - min(state.minimum, value)
+        return spread if spread > limit else None
+
+    def process(self, sensor_id, field, value, date=None):
+        """Update the sensor's state with a reading and return the alerts it raises."""
+        rules = self.rules.get(field)
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return []
+        self.stats["readings"] += 1
+        state = self.states.get((sensor_id, field))
+        if state is None:
+            state = self.states[(sensor_id, field)] = SensorState()
+
+        alerts = []
+        if rules:
+            # Rules compare the reading with the history before it
+            now = time.monotonic()
+            for rule in rules:
+                observed = self.check(rule, state, value)
+                if observed is None:
+                    continue
+                key = (sensor_id, field, rule["name"])
+                if now - self.last_alert.get(key, -ALERT_COOLDOWN) < ALERT_COOLDOWN:
+                    self.stats["suppressed"] += 1
+                    continue
+                self.last_alert[key] = now
+                self.stats["alerts"] += 1
+                alerts.append({
+                    "Sensor_ID": sensor_id,
+                    "Field": field,
+                    "Rule": rule["name"],
+                    "Kind": rule["kind"],
+                    "Limit": rule["limit"],
+                    "Observed": round(observed, 3),
+                    "Value": value,
+                    "Mean": round(state.mean, 3) if state.count else None,
+                    "Date": date,
+                })
+        state.update(value)
+        return alerts
+
+    def snapshot(self, sensor_id, field):
+        """Current statistics of one sensor, or None if it has not reported."""
+        state = self.states.get((sensor_id, field))
+        if state is None:
+            return None
+        return {"count": state.count, "mean": state.mean, "stddev": math.sqrt(state.variance),
+                "min": state.minimum, "max": state.maximum, "last": state.last}
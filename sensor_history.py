@@ -0,0 +1,177 @@
+import argparse
+import itertools
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from flask import jsonify, request
+
+from iot_export import DB_Name, EXPORT_PORT, SENSOR_TABLES, create_app, parse_sensors, parse_time
+
+# History Configuration
+HISTORY_POINTS = 500  # Default points per series returned to a chart
+HISTORY_MAX_POINTS = 5000
+HISTORY_CACHE_SIZE = 256  # Downsampled series kept, least recently used evicted first
+
+def read_series(conn, sensor, start=None, end=None, sensor_id=None):
+    """Read (timestamps, values) of one sensor table in [start, end) through the Timestamp index."""
+    low = -math.inf if start is None else start
+    high = math.inf if end is None else end
+    query = (f"select Timestamp, cast({sensor} as real) from {SENSOR_TABLES[sensor]} "
+             f"where Timestamp >= ? and Timestamp < ? and {sensor} is not null")
+    args = [low, high]
+    if sensor_id is not None:
+        query += " and SensorID = ?"
+        args.append(sensor_id)
+    # Flattened straight into one array, skipping a list of row tuples
+    flat = np.fromiter(itertools.chain.from_iterable(conn.execute(query + " order by Timestamp", args)),
+                       dtype=np.float64)
+    return flat[0::2], flat[1::2]
+
+def lttb(x, y, points):
+    """Largest-Triangle-Three-Buckets downsampling of a time-ordered series to at most points points.
+
+    The first and last points are kept; every bucket in between contributes the point
+    forming the largest triangle with the previously kept point and the next bucket's
+    average. Bucket averages come from one reduceat pass, and each bucket's triangle
+    areas are computed as a single array operation.
+    """
+    size = len(x)
+    if points >= size or size < 3:
+        return x, y
+    if points < 3:
+        raise ValueError("LTTB needs at least 3 points")
+    every = (size - 2) / (points - 2)
+    # Bucket b covers bounds[b]:bounds[b + 1]; the extra last bucket is the final point alone
+    bounds = np.append((np.arange(points - 1) * every).astype(np.intp) + 1, size)
+    counts = np.diff(bounds)
+    avg_x = np.add.reduceat(x, bounds[:-1]) / counts
+    avg_y = np.add.reduceat(y, bounds[:-1]) / counts
+
+    selected = np.empty(points, dtype=np.intp)
+    selected[0], selected[-1] = 0, size - 1
+    a = 0
+    for b in range(points - 2):
+        lo, hi = bounds[b], bounds[b + 1]
+        ax, ay = x[a], y[a]
+        # Twice the triangle area; the constant factor does not change the argmax
+        area = np.abs((ax - avg_x[b + 1]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (avg_y[b + 1] - ay))
+        a = lo + int(area.argmax())
+        selected[b + 1] = a
+    return x[selected], y[selected]
+
+class HistoryCache:
+    """LRU cache of downsampled series keyed by (sensor, sensor_id, start, end, points).
+
+    An entry remembers the table's highest row id when it was computed. When rows have
+    been added since, it is recomputed only if one of them falls inside its range.
+    """
+
+    def __init__(self, db_path=DB_Name, max_entries=HISTORY_CACHE_SIZE):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def is_fresh(self, conn, sensor, start, end, sensor_id, last_id):
+        table = SENSOR_TABLES[sensor]
+        newest = conn.execute(f"select max(id) from {table}").fetchone()[0] or 0
+        if newest == last_id:
+            return True, newest
+        query = f"select 1 from {table} where id > ? and Timestamp >= ? and Timestamp < ?"
+        args = [last_id, -math.inf if start is None else start, math.inf if end is None else end]
+        if sensor_id is not None:
+            query += " and SensorID = ?"
+            args.append(sensor_id)
+        return conn.execute(query + " limit 1", args).fetchone() is None, newest
+
+    def get(self, conn, sensor, start=None, end=None, points=HISTORY_POINTS, sensor_id=None):
+        """Return the downsampled series as a dict ready to be serialised to JSON."""
+        key = (sensor, sensor_id, start, end, points)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        if entry is not None:
+            fresh, newest = self.is_fresh(conn, sensor, start, end, sensor_id, entry["last_id"])
+            if fresh:
+                entry["last_id"] = newest
+                self.stats["hits"] += 1
+                return entry["series"]
+
+        self.stats["misses"] += 1
+        last_id = conn.execute(f"select max(id) from {SENSOR_TABLES[sensor]}").fetchone()[0] or 0
+        x, y = read_series(conn, sensor, start, end, sensor_id)
+        tx, ty = lttb(x, y, points)
+        series = {"sensor": sensor, "sensor_id": sensor_id, "raw_points": len(x),
+                  "t": tx.tolist(), "v": ty.tolist()}
+        with self.lock:
+            self.entries[key] = {"series": series, "last_id": last_id}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return series
+
+def create_history_app(db_path=DB_Name):
+    """The export app plus GET /history?sensors=...&start=...&end=...&points=...&sensor_id=..."""
+    app = create_app(db_path)
+    cache = HistoryCache(db_path)
+
+    @app.route("/history")
+    def history_endpoint():
+        try:
+            sensors = parse_sensors(request.args.get("sensors"))
+            start = parse_time(request.args.get("start"))
+            end = parse_time(request.args.get("end"))
+            points = int(request.args.get("points", HISTORY_POINTS))
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+        if not 3 <= points <= HISTORY_MAX_POINTS:
+            return jsonify(error=f"points must be between 3 and {HISTORY_MAX_POINTS}"), 400
+        sensor_id = request.args.get("sensor_id") or None
+        conn = sqlite3.connect(db_path)
+        try:
+            series = [cache.get(conn, sensor, start, end, points, sensor_id) for sensor in sensors]
+        finally:
+            conn.close()
+        return jsonify(start=start, end=end, points=points, series=series)
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Downsampled sensor history for charts (LTTB)")
+    parser.add_argument("--db", default=DB_Name)
+    parser.add_argument("--sensors", help=f"Comma-separated subset of {', '.join(SENSOR_TABLES)} (default: all)")
+    parser.add_argument("--start", help="Epoch seconds or ISO date/time, inclusive")
+    parser.add_argument("--end", help="Epoch seconds or ISO date/time, exclusive")
+    parser.add_argument("--points", type=int, default=HISTORY_POINTS)
+    parser.add_argument("--sensor-id")
+    parser.add_argument("--serve", action="store_true", help="Serve GET /history and GET /export over HTTP instead")
+    parser.add_argument("--port", type=int, default=EXPORT_PORT)
+    args = parser.parse_args()
+
+    if args.serve:
+        create_history_app(args.db).run(port=args.port, threaded=True)
+        return
+    try:
+        sensors = parse_sensors(args.sensors)
+        start, end = parse_time(args.start), parse_time(args.end)
+    except ValueError as e:
+        parser.error(str(e))
+    cache = HistoryCache(args.db)
+    conn = sqlite3.connect(args.db)
+    for sensor in sensors:
+        for attempt in ("cold", "cached"):
+            started = time.perf_counter()
+            series = cache.get(conn, sensor, start, end, args.points, args.sensor_id)
+            elapsed = time.perf_counter() - started
+            print(f"{sensor} ({attempt}): {series['raw_points']} rows -> {len(series['t'])} points "
+                  f"in {elapsed * 1000:.1f} ms")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import json
+import random
+import struct
+import timeit
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON decoders by name; orjson is used when installed
+BACKENDS = {"json": json.loads}
+if orjson is not None:
+    BACKENDS["orjson"] = orjson.loads
+DEFAULT_BACKEND = "orjson" if orjson is not None else "json"
+
+# Sensor readings arrive as strings from the simulators but numbers are accepted too
+SENSOR_VALUE = (str, int, float)
+
+class PayloadError(ValueError):
+    """Raised when a payload is not valid JSON or does not match its schema."""
+
+class PayloadSchema:
+    """Declares the fields a JSON payload must carry and the types accepted for each.
+
+    decode() returns only the declared fields, so consumers never handle the
+    rest of the record, and rejects payloads with missing or mistyped fields.
+    """
+
+    def __init__(self, fields, backend=None):
+        self.fields = tuple((name, types if isinstance(types, tuple) else (types,))
+                            for name, types in fields.items())
+        self.loads = BACKENDS[backend or DEFAULT_BACKEND]
+
+    def decode(self, payload):
+        """Decode a str or bytes payload into a dict of the declared fields."""
+        try:
+            record = self.loads(payload)
+        except ValueError as e:
+            raise PayloadError(f"Invalid JSON payload: {e}") from None
+        if not isinstance(record, dict):
+            raise PayloadError("Payload is not a JSON object")
+        values = {}
+        for name, types in self.fields:
+            try:
+                value = record[name]
+            except KeyError:
+                raise PayloadError(f"Payload is missing field {name}") from None
+            # bool is an int subclass, so only accept it where it is declared
+            if not isinstance(value, types) or (value is True or value is False) and bool not in types:
+                raise PayloadError(f"Field {name} has type {type(value).__name__}, "
+                                   f"expected {' or '.join(t.__name__ for t in types)}")
+            values[name] = value
+        return values
+
+def sensor_schema(value_field, backend=None):
+    """Schema of a sensor reading as published on Home/BedRoom/<value_field>."""
+    return PayloadSchema({"Sensor_ID": str, "Date": str, value_field: SENSOR_VALUE}, backend)
+
+SENSOR_SCHEMAS = {field: sensor_schema(field) for field in ("Temperature", "Humidity", "Pressure")}
+
+# Binary sensor payloads: a header followed by count fixed-size readings, little-endian.
+# The first byte can never start a JSON document, so both formats share a topic.
+BINARY_MAGIC = 0xB5
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<BBH")  # magic, version, reading count
+BINARY_READING = struct.Struct("<16sBqi")  # sensor ID, sensor kind, epoch microseconds, value in hundredths
+SENSOR_KINDS = list(SENSOR_SCHEMAS)
+DATE_FORMAT = "%d-%b-%Y %H:%M:%S:%f"
+DATE_CACHE_SIZE = 4096  # Formatted whole seconds kept; readings arrive in time order
+
+date_prefixes = {}
+date_seconds = {}
+
+def format_timestamp(micros):
+    """Format epoch microseconds as DATE_FORMAT, reusing the formatting of each whole second."""
+    seconds, fraction = divmod(micros, 1000000)
+    prefix = date_prefixes.get(seconds)
+    if prefix is None:
+        if len(date_prefixes) >= DATE_CACHE_SIZE:
+            date_prefixes.clear()
+        prefix = date_prefixes[seconds] = datetime.fromtimestamp(seconds).strftime("%d-%b-%Y %H:%M:%S")
+    return f"{prefix}:{fraction:06d}"
+
+def parse_timestamp(date):
+    """Parse a DATE_FORMAT string back to epoch seconds, or None if it is in another format."""
+    prefix, _, fraction = date.rpartition(":")
+    seconds = date_seconds.get(prefix)
+    try:
+        if seconds is None:
+            if len(date_seconds) >= DATE_CACHE_SIZE:
+                date_seconds.clear()
+            seconds = date_seconds[prefix] = datetime.strptime(prefix, "%d-%b-%Y %H:%M:%S").timestamp()
+        return seconds + int(fraction) / 1e6
+    except (TypeError, ValueError):
+        return None
+
+def is_binary_payload(payload):
+    return isinstance(payload, (bytes, bytearray)) and payload[:1] == bytes([BINARY_MAGIC])
+
+def encode_binary(readings):
+    """Pack (sensor_id, field, epoch_seconds, value) readings into one binary payload.
+
+    Values are sent as fixed-point hundredths, so they round-trip exactly at the
+    two decimals the simulators publish.
+    """
+    readings = list(readings)
+    parts = [BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(readings))]
+    for sensor_id, field, timestamp, value in readings:
+        if len(sensor_id.encode()) > 16:
+            raise ValueError(f"Sensor ID {sensor_id!r} is longer than the 16 bytes of the binary format")
+        parts.append(BINARY_READING.pack(sensor_id.encode(), SENSOR_KINDS.index(field),
+                                         round(timestamp * 1e6), round(float(value) * 100)))
+    return b"".join(parts)
+
+def decode_binary(payload):
+    """Unpack a binary payload into (field, record) pairs shaped like decoded JSON readings."""
+    try:
+        magic, version, count = BINARY_HEADER.unpack_from(payload)
+    except struct.error:
+        raise PayloadError("Binary payload is shorter than its header") from None
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise PayloadError(f"Unsupported binary payload version {version}")
+    if len(payload) != BINARY_HEADER.size + count * BINARY_READING.size:
+        raise PayloadError(f"Binary payload of {len(payload)} bytes does not hold {count} readings")
+    readings = []
+    for sensor_id, kind, micros, hundredths in BINARY_READING.iter_unpack(memoryview(payload)[BINARY_HEADER.size:]):
+        if kind >= len(SENSOR_KINDS):
+            raise PayloadError(f"Unknown sensor kind {kind} in binary payload")
+        field = SENSOR_KINDS[kind]
+        try:
+            sensor_id = sensor_id.rstrip(b"\0").decode()
+        except UnicodeDecodeError:
+            raise PayloadError(f"Sensor ID {sensor_id!r} in binary payload is not UTF-8") from None
+        try:
+            date = format_timestamp(micros)
+        except (OverflowError, OSError, ValueError):
+            raise PayloadError(f"Timestamp {micros} us in binary payload is out of range") from None
+        readings.append((field, {"Sensor_ID": sensor_id, "Date": date, field: hundredths / 100}))
+    return readings
+
+def decode_sensor_payload(topic, payload):
+    """Decode a JSON or binary sensor payload into (field, record) pairs.
+
+    JSON payloads carry one reading whose field is named by the topic; binary
+    payloads name the field of every reading themselves.
+    """
+    if is_binary_payload(payload):
+        return decode_binary(payload)
+    for field, schema in SENSOR_SCHEMAS.items():
+        if field in topic:
+            return [(field, schema.decode(payload))]
+    return []
+
+def benchmark(count=100000, batch_size=10):
+    """Compare JSON decoders and the binary format on realistic sensor payloads."""
+    fields = list(SENSOR_SCHEMAS)
+    readings = []
+    payloads = []
+    for i in range(1000):
+        field = fields[i % len(fields)]
+        timestamp = datetime.now().timestamp()
+        value = f"{random.uniform(0, 100):.2f}"
+        readings.append((f"Dummy-{i % 8 + 1}", field, timestamp, value))
+        payloads.append((field, json.dumps({
+            "Sensor_ID": f"Dummy-{i % 8 + 1}",
+            "Date": datetime.fromtimestamp(timestamp).strftime(DATE_FORMAT),
+            field: value,
+        }).encode()))
+    work = (payloads * (count // len(payloads) + 1))[:count]
+    binary_single = [encode_binary([reading]) for reading in readings]
+    binary_batches = [encode_binary(readings[i:i + batch_size]) for i in range(0, len(readings), batch_size)]
+    binary_work = (binary_single * (count // len(binary_single) + 1))[:count]
+    batch_work = (binary_batches * (count // len(readings) + 1))[:count // batch_size]
+
+    def plain_json():
+        for field, payload in work:
+            record = json.loads(payload)
+            record["Sensor_ID"], record["Date"], record[field]
+
+    json_size = sum(len(p) for _, p in payloads) / len(payloads)
+    candidates = [("json.loads + key lookup", plain_json, json_size)]
+    for backend in BACKENDS:
+        schemas = {field: sensor_schema(field, backend) for field in fields}
+
+        def schema_decode(schemas=schemas):
+            for field, payload in work:
+                schemas[field].decode(payload)
+
+        candidates.append((f"PayloadSchema ({backend})", schema_decode, json_size))
+
+    def binary_decode():
+        for payload in binary_work:
+            decode_binary(payload)
+
+    def batch_decode():
+        for payload in batch_work:
+            decode_binary(payload)
+
+    candidates.append(("binary, 1 per message", binary_decode, len(binary_single[0])))
+    candidates.append((f"binary, {batch_size} per message", batch_decode, len(binary_batches[0]) / batch_size))
+
+    baseline = None
+    for name, run, size in candidates:
+        seconds = min(timeit.repeat(run, number=1, repeat=3))
+        baseline = baseline or seconds
+        print(f"{name:<26} {size:6.1f} B/reading  {seconds / count * 1e6:6.2f} us/reading  "
+              f"{count / seconds:>10,.0f} readings/s  {baseline / seconds:4.1f}x")
+
+if __name__ == "__main__":
+    benchmark()
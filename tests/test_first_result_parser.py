@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from EXPO3Laboratorinis import parse_first_result
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FIRST_RESULT = "https://www.gsmarena.com/apple_iphone_15-12559.php"
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+def chunked(text, size):
+    return (text[i:i + size] for i in range(0, len(text), size))
+
+def test_first_result_of_saved_page():
+    assert parse_first_result([read_fixture("results.php3")]) == FIRST_RESULT
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, 1024])
+def test_first_result_with_chunk_sizes(size):
+    assert parse_first_result(chunked(read_fixture("results.php3"), size)) == FIRST_RESULT
+
+def test_first_result_split_at_every_position():
+    page = read_fixture("results.php3")
+    for split in range(1, len(page)):
+        assert parse_first_result([page[:split], page[split:]]) == FIRST_RESULT, split
+
+def test_links_outside_results_container_are_ignored():
+    # Header and sidebar list items hold links too; only those inside div.makers count
+    page = read_fixture("results.php3")
+    assert parse_first_result([page.replace('class="makers"', 'class="other"')]) is None
+
+def test_nested_div_in_list_item():
+    page = ('<div class="listing"><div class="note"><div>Sponsored</div></div>'
+            '<ul><li><div class="thumb"><a href="nokia_3310-192.php">Nokia 3310</a></div></li></ul></div>')
+    assert parse_first_result(chunked(page, 5)) == "https://www.gsmarena.com/nokia_3310-192.php"
+
+def test_container_closes_before_later_lists():
+    page = ('<div class="makers"><div class="note"></div></div>'
+            '<div class="sidebar"><ul><li><a href="samsung-phones-9.php">Samsung</a></li></ul></div>')
+    assert parse_first_result([page]) is None
+
+def test_no_result_page():
+    assert parse_first_result(chunked(read_fixture("results_empty.php3"), 16)) is None
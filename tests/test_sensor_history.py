@@ -0,0 +1,63 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sensor_history import lttb
+
+def lttb_reference(x, y, points):
+    """Point-by-point LTTB as originally described, returning the kept indices."""
+    size = len(x)
+    every = (size - 2) / (points - 2)
+    selected = [0]
+    a = 0
+    for i in range(points - 2):
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, size)
+        avg_x = sum(x[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_y = sum(y[avg_start:avg_end]) / (avg_end - avg_start)
+        best, best_area = None, -1.0
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(size - 1)
+    return selected
+
+def random_series(size, seed):
+    rng = np.random.default_rng(seed)
+    # Irregular sampling and a noisy random walk, like readings from a flaky sensor
+    x = np.cumsum(rng.uniform(0.1, 5.0, size)) + 1.7e9
+    y = np.cumsum(rng.normal(0, 1, size)) + 20
+    return x, y
+
+@pytest.mark.parametrize("size,points", [(10, 3), (10, 5), (101, 7), (1000, 500), (1000, 999), (4999, 100)])
+def test_matches_reference(size, points):
+    x, y = random_series(size, seed=size + points)
+    expected = lttb_reference(x.tolist(), y.tolist(), points)
+    tx, ty = lttb(x, y, points)
+    assert len(tx) == points
+    assert np.array_equal(tx, x[expected])
+    assert np.array_equal(ty, y[expected])
+
+def test_keeps_spikes():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.zeros(1000)
+    y[[137, 512, 870]] = [50, -40, 30]
+    tx, ty = lttb(x, y, 20)
+    assert {137, 512, 870} <= set(tx.astype(int).tolist())
+
+def test_short_series_returned_unchanged():
+    x, y = random_series(50, seed=1)
+    tx, ty = lttb(x, y, 50)
+    assert tx is x and ty is y
+
+def test_too_few_points():
+    x, y = random_series(50, seed=2)
+    with pytest.raises(ValueError):
+        lttb(x, y, 2)
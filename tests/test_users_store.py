@@ -0,0 +1,66 @@
+import importlib.util
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_stream import read_document_skeleton
+from users_store import UserStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_script(name):
+    spec = importlib.util.spec_from_file_location(name.replace(".py", ""), os.path.join(ROOT, name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def make_user(n):
+    return {
+        "name": f"Vartotojas Nr. {n} – Šiauliai",
+        "age": 20 + n % 50,
+        "score": n / 7,
+        "active": n % 3 == 0,
+        "manager": None,
+        "tags": [f"t{n % 4}", "žymė"] if n % 2 else [],
+        "address": {"city": "Kaunas", "zip": f"{n:05d}", "geo": {"lat": 54.9 + n / 1e4, "lon": 23.9}},
+        "prefs": {},
+    }
+
+def write_users_file(path, user_ids, extra):
+    document = {"version": 3, "table": {"name": "users", "users": {str(i): make_user(i + extra) for i in user_ids}},
+                "exported": "2026-10-19"}
+    with open(path, "w") as f:
+        json.dump(document, f, indent=4)
+    return path
+
+def build_store(tmp_path, path1, path2):
+    store = UserStore(str(tmp_path / "users.db"))
+    store.set_skeleton(read_document_skeleton(path1))
+    store.upsert_file(path1)
+    store.upsert_file(path2)
+    return store
+
+def test_export_matches_2mqtt_merge_byte_for_byte(tmp_path):
+    path1 = write_users_file(tmp_path / "users1.json", range(0, 300), extra=0)
+    # Overlaps part of users1 with changed users and adds new ones after it
+    path2 = write_users_file(tmp_path / "users2.json", list(range(250, 400)) + [5, 17], extra=1000)
+    expected = tmp_path / "merged_expected.json"
+    load_script("2MQTT.py").merge_in_memory(path1, path2, expected)
+
+    store = build_store(tmp_path, path1, path2)
+    exported = tmp_path / "merged_store.json"
+    store.export(exported)
+    assert store.count() == 400
+    store.close()
+    assert exported.read_bytes() == expected.read_bytes()
+
+def test_upsert_keeps_first_position_and_serves_lookups(tmp_path):
+    path1 = write_users_file(tmp_path / "users1.json", range(0, 10), extra=0)
+    path2 = write_users_file(tmp_path / "users2.json", [3, 42], extra=500)
+    store = build_store(tmp_path, path1, path2)
+    assert [user_id for user_id, _ in store.iter_users()] == [str(i) for i in range(10)] + ["42"]
+    assert store.get("3") == make_user(503)
+    assert store.get("missing") is None
+    store.close()
@@ -0,0 +1,124 @@
+import argparse
+import json
+import sqlite3
+from json_stream import iter_users, read_document_skeleton, write_document_with_users
+
+# Users written per transaction while importing
+UPSERT_BATCH_SIZE = 10000
+
+class UserStore:
+    """SQLite store of a users document: indexed point lookups, upserts and JSON export.
+
+    Users keep the position of their first insertion, so an export has the same
+    member order as the dict.update merge in 2MQTT.py.
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            create table if not exists users (
+              user_id text primary key,
+              data text not null
+            );
+            create table if not exists meta (
+              key text primary key,
+              value text not null
+            );
+        """)
+        self.conn.commit()
+
+    def set_skeleton(self, document):
+        """Store the non-user part of the document, used to rebuild its shape on export."""
+        self.conn.execute("insert or replace into meta (key, value) values ('skeleton', ?)", (json.dumps(document),))
+        self.conn.commit()
+
+    def get_skeleton(self):
+        row = self.conn.execute("select value from meta where key = 'skeleton'").fetchone()
+        return json.loads(row[0]) if row else {"table": {"users": {}}}
+
+    def get(self, user_id):
+        """Return one user, or None, through the primary key index."""
+        row = self.conn.execute("select data from users where user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def upsert(self, items):
+        """Insert or replace (user_id, user) pairs in batches. Returns the number written."""
+        count = 0
+        batch = []
+        for user_id, user in items:
+            batch.append((user_id, json.dumps(user)))
+            if len(batch) >= UPSERT_BATCH_SIZE:
+                count += self.write_batch(batch)
+                batch = []
+        count += self.write_batch(batch)
+        return count
+
+    def write_batch(self, batch):
+        # "on conflict do update" keeps the existing rowid, and with it the export position
+        self.conn.executemany("insert into users (user_id, data) values (?, ?) "
+                              "on conflict (user_id) do update set data = excluded.data", batch)
+        self.conn.commit()
+        return len(batch)
+
+    def upsert_file(self, path):
+        """Upsert every user of a users JSON file, read as a stream."""
+        return self.upsert(iter_users(path))
+
+    def iter_users(self):
+        """Yield (user_id, user) pairs in insertion order."""
+        for user_id, data in self.conn.execute("select user_id, data from users order by rowid"):
+            yield user_id, json.loads(data)
+
+    def count(self):
+        return self.conn.execute("select count(*) from users").fetchone()[0]
+
+    def export(self, out_path):
+        """Write the store back out in the merged_users.json shape."""
+        with open(out_path, 'w') as outfile:
+            write_document_with_users(outfile, self.get_skeleton(), self.iter_users())
+
+    def close(self):
+        self.conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexed SQLite store for merged users exports")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    build = subparsers.add_parser("build", help="Create a store from a users JSON file")
+    build.add_argument("source", nargs="?", default="merged_users.json")
+    build.add_argument("--db", default="users.db")
+    get = subparsers.add_parser("get", help="Print one user")
+    get.add_argument("user_id")
+    get.add_argument("--db", default="users.db")
+    upsert = subparsers.add_parser("upsert", help="Insert or update users from more JSON files")
+    upsert.add_argument("sources", nargs="+")
+    upsert.add_argument("--db", default="users.db")
+    export = subparsers.add_parser("export", help="Write the store as a users JSON file")
+    export.add_argument("output", nargs="?", default="merged_users.json")
+    export.add_argument("--db", default="users.db")
+    args = parser.parse_args()
+
+    store = UserStore(args.db)
+    try:
+        if args.action == "build":
+            store.set_skeleton(read_document_skeleton(args.source))
+            count = store.upsert_file(args.source)
+            print(f"Imported {count} users from {args.source} into {args.db}")
+        elif args.action == "get":
+            user = store.get(args.user_id)
+            if user is None:
+                print(f"User {args.user_id} not found")
+            else:
+                print(json.dumps(user, indent=4))
+        elif args.action == "upsert":
+            for source in args.sources:
+                count = store.upsert_file(source)
+                print(f"Upserted {count} users from {source}")
+            print(f"{args.db} now holds {store.count()} users")
+        elif args.action == "export":
+            store.export(args.output)
+            print(f"Exported {store.count()} users to {args.output}")
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()